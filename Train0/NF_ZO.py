@@ -5,19 +5,22 @@ from pyomo.environ import (
     TransformationFactory,
     units as pyunits,
     assert_optimal_termination,
+    check_optimal_termination,
     Block,
     Constraint,
     Objective,
     units
 )
 import json
-import math
+import os
 import sys
+import hashlib
 from pyomo.network import Arc
 from idaes.core import FlowsheetBlock
 from idaes.core.solvers import get_solver
 from idaes.models.unit_models.translator import Translator
 from idaes.core.util.initialization import propagate_state
+from idaes.core.util.model_serializer import StoreSpec, from_json, to_json
 from idaes.models.unit_models import Product, Feed
 from idaes.core import UnitModelCostingBlock
 import idaes.core.util.scaling as iscale
@@ -35,11 +38,21 @@ from idaes.core.util.scaling import (
 )
 
 sys.path.append('/Users/nicktiwari/Documents/prommis/src/')
-from prommis.uky.costing.ree_plant_capcost import QGESSCosting, QGESSCostingData
 
-def nanofiltration(m, Q_in = 100):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from auto_scaling import autoscale, feed_flows, set_flow_scaling
+from nf_analytic import nanofiltration_analytic, validate_against_model
+from qgess_costing import build_qgess_costing
+from prommis.uky.costing.ree_plant_capcost import QGESSCostingData
+
+SOLUTE_PARAMETERS_FILE = "../solute_parameters.json"
+
+# solved NF summaries keyed by (sha256 of solute parameter file, Q_in)
+_nf_cache = {}
+
+def nanofiltration(m, Q_in = 100, free_ion = "Cl", initialize = True):
     # Read data from 'solute_parameters.json'
-    with open("../solute_parameters.json") as f:
+    with open(SOLUTE_PARAMETERS_FILE) as f:
         solute_data = json.load(f)
 
     # solute list
@@ -86,13 +99,23 @@ def nanofiltration(m, Q_in = 100):
 
     # fully specify system
     m.fs.unit.properties_permeate[0].pressure.fix(101325)
-    m.fs.unit.recovery_vol_phase.fix(0.5)
+    recovery = 0.5
+    m.fs.unit.recovery_vol_phase.fix(recovery)
 
     for key in solute_list:
-        if key != "Cl":
+        if key != free_ion:
             m.fs.unit.rejection_phase_comp[0, "Liq", key].fix(solute_data[key]['rejection_phase_comp'])
 
-    m.fs.unit.rejection_phase_comp[0, "Liq", "Cl"] = 0.15  # guess, but electroneutrality enforced below
+    # pre-solve: the free ion rejection that makes the retentate electroneutral,
+    # so the unit is initialized from a consistent point (enforced below)
+    presolve = nanofiltration_analytic(
+        Q_in,
+        [solute_data[key]['mass_flow'] for key in solute_list],
+        solute_data,
+        free_ion=free_ion,
+        recovery=recovery,
+    )
+    m.fs.unit.rejection_phase_comp[0, "Liq", free_ion] = float(presolve[f"{free_ion} Rejection"][0])
     charge_comp = {key: solute_data[key]['charge'] for key in solute_list}
 
     m.fs.unit.eq_electroneutrality = Constraint(
@@ -105,28 +128,20 @@ def nanofiltration(m, Q_in = 100):
     )
     constraint_scaling_transform(m.fs.unit.eq_electroneutrality, 1)
 
-    def inverse_order_of_magnitude(number):
-        if number == 0:
-            return "undefined"  # The order of magnitude for zero is undefined
-        magnitude = math.floor(math.log10(abs(number)))
-        return 10**(-magnitude)
+    # scaling, the inverse of the order of magnitude of each feed flow
+    set_flow_scaling(m.fs.properties, feed_flows(m.fs.feed.properties[0]))
 
-    # scaling
-    m.fs.properties.set_default_scaling(
-        "flow_mass_phase_comp", 1e-2, index=("Liq", "H2O")
-    )
+    iscale.set_scaling_factor(m.fs.P1.control_volume.work, 1e-3)
 
-    # Set the scaling to be the inverse of the order of magnitude of the mass concentration
-    for key in solute_list:
-        m.fs.properties.set_default_scaling(
-            "flow_mass_phase_comp", inverse_order_of_magnitude(solute_data[key]['mass_flow']), index=("Liq", key)
-         )
+    iscale.calculate_scaling_factors(m)
 
+    if initialize:
+        initialize_nanofiltration(m)
 
-    iscale.set_scaling_factor(m.fs.P1.control_volume.work, 1e-3)
+    return m
 
-    iscale.calculate_scaling_factors(m)
 
+def initialize_nanofiltration(m):
     # initialize
     m.fs.feed.initialize()
     propagate_state(m.fs.s01)
@@ -138,56 +153,128 @@ def nanofiltration(m, Q_in = 100):
     propagate_state(m.fs.s04)
     m.fs.disposal.initialize()
 
-    return m
+    autoscale(m)
+
+
+def _nf_cache_key(Q_in, free_ion="Cl"):
+    with open(SOLUTE_PARAMETERS_FILE, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return digest, float(Q_in), free_ion
+
+
+def solve_nanofiltration(Q_in=100, solver=None, free_ion="Cl", validate=False, rtol=1e-3):
+    """
+    Build and solve the NF flowsheet and return a summary of the result.
+
+    The summary is memoized on the contents of the solute parameter file,
+    Q_in and the free ion, so repeated calls within a sweep only pay for the
+    first optimal solve. validate=True always solves, and raises if the closed-form
+    nf_analytic result differs from the solved model by more than rtol.
+    """
+    key = _nf_cache_key(Q_in, free_ion)
+    if validate or key not in _nf_cache:
+        m = ConcreteModel()
+        m.fs = FlowsheetBlock(dynamic=False)
+        nanofiltration(m, Q_in=Q_in, free_ion=free_ion)
+        if solver is None:
+            solver = get_solver()
+        results = solver.solve(m)
+        if validate:
+            assert_optimal_termination(results)
+            comparison = validate_against_model(m, free_ion=free_ion, rtol=rtol)
+            off = [name for name, (_, _, error) in comparison.items() if error > rtol]
+            if off:
+                raise RuntimeError(f"Analytic NF result differs from the model in {off}")
+        summary = {
+            "Termination Condition": str(results.solver.termination_condition),
+            "Permeate Flow": value(m.fs.unit.properties_permeate[0].flow_vol_phase["Liq"]),
+            "Retentate Flow": value(m.fs.unit.feed_side.properties_out[0].flow_vol_phase["Liq"]),
+            f"{free_ion} Rejection": value(m.fs.unit.rejection_phase_comp[0, "Liq", free_ion]),
+            "Pump Work": value(m.fs.P1.work_mechanical[0]),
+        }
+        # failed solves are returned but not memoized, so the next call retries
+        if not check_optimal_termination(results):
+            return summary
+        _nf_cache[key] = summary
+    return dict(_nf_cache[key])
+
 
 def qgess_costing(m):
-    m.fs.costing2 = QGESSCosting()
-    CE_index_year = "UKy_2019"
-    m.fs.land_cost = 1
-    m.fs.costing2.build_process_costs(
-    # arguments related to installation costs
-        piping_materials_and_labor_percentage=20,
-        electrical_materials_and_labor_percentage=20,
-        instrumentation_percentage=8,
-        plants_services_percentage=10,
-        process_buildings_percentage=40,
-        auxiliary_buildings_percentage=15,
-        site_improvements_percentage=10,
-        equipment_installation_percentage=17,
-        field_expenses_percentage=12,
-        project_management_and_construction_percentage=30,
-        process_contingency_percentage=15,
-        # argument related to Fixed OM costs
-        labor_types=[
-            "skilled",
-            "unskilled",
-            "supervisor",
-            "maintenance",
-            "technician",
-            "engineer",
-        ],
-        labor_rate=[24.98, 19.08, 30.39, 22.73, 21.97, 45.85],  # USD/hr
-        labor_burden=25,  # % fringe benefits
-        operators_per_shift=[4, 9, 2, 2, 2, 3],
-        hours_per_shift=8,
-        shifts_per_day=3,
-        operating_days_per_year=336,
-        mixed_product_sale_price_realization_factor=0.65,  # 65% price realization for mixed products
-        # arguments related to total owners costs
-        land_cost=m.fs.land_cost,
-        resources=[],
-        rates=[],
-        fixed_OM=True,
-        variable_OM=True,
-        feed_input=None,
-        efficiency=0.80,  # power usage efficiency, or fixed motor/distribution efficiency
-        waste=[],
-        recovery_rate_per_year=None,
-        CE_index_year="UKy_2019",
-        watertap_blocks = [m.fs.unit, m.fs.P1]
-    )
-    QGESSCostingData.costing_initialization(m.fs.costing2)
-    QGESSCostingData.initialize_fixed_OM_costs(m.fs.costing2)
+    build_qgess_costing(m.fs, [m.fs.unit, m.fs.P1], land_cost=1)
+
+
+def _set_feed_water(m, Q_in):
+    # re-fix the feed water flow [kg/s] on the state variable calculate_state held
+    state = m.fs.feed.properties[0]
+    if m.fs.properties.config.material_flow_basis == props.MaterialFlowBasis.mass:
+        state.flow_mass_phase_comp["Liq", "H2O"].fix(Q_in)
+    else:
+        state.flow_mol_phase_comp["Liq", "H2O"].fix(
+            Q_in / value(m.fs.properties.mw_comp["H2O"])
+        )
+
+
+def _sweep_row(m, free_ion):
+    return {
+        "Permeate Flow": value(m.fs.unit.properties_permeate[0].flow_vol_phase["Liq"]),
+        "Retentate Flow": value(m.fs.unit.feed_side.properties_out[0].flow_vol_phase["Liq"]),
+        f"{free_ion} Rejection": value(m.fs.unit.rejection_phase_comp[0, "Liq", free_ion]),
+        "Pump Work": value(m.fs.P1.work_mechanical[0]),
+        "annualized_cost": value(m.fs.costing2.annualized_cost),
+        "total_fixed_OM_cost": value(m.fs.costing2.total_fixed_OM_cost),
+        "total_variable_OM_cost": value(m.fs.costing2.total_variable_OM_cost[0]),
+        "total_plant_cost": value(m.fs.costing2.total_plant_cost),
+    }
+
+
+def nf_sweep(recoveries=(0.5,), pressures=(10e5,), flows=(100,), solver=None, free_ion="Cl"):
+    """
+    Sweep the NF flowsheet with QGESS costing over every combination of
+    recovery_vol_phase, P1 outlet pressure [Pa] and feed water flow Q_in
+    [kg/s].
+
+    One model is built and initialized; each point is solved from the
+    previous solution, and the inner loops alternate direction so that
+    consecutive points stay close. After a failed point the model is reset
+    to the last converged state.
+
+    Returns a pandas DataFrame with one row per point: the inputs, the
+    termination condition, flows, free ion rejection, pump work and the
+    QGESS cost outputs (NaN for failed points).
+    """
+    import pandas as pd
+
+    m = ConcreteModel()
+    m.fs = FlowsheetBlock(dynamic=False)
+    nanofiltration(m, Q_in=flows[0], free_ion=free_ion)
+    qgess_costing(m)
+    if solver is None:
+        solver = get_solver()
+
+    last_good = None
+    rows = []
+    forward = True
+    for Q_in in flows:
+        _set_feed_water(m, Q_in)
+        for pressure in pressures:
+            m.fs.P1.outlet.pressure[0].fix(pressure)
+            for recovery in (recoveries if forward else recoveries[::-1]):
+                m.fs.unit.recovery_vol_phase.fix(recovery)
+                results = solver.solve(m)
+                row = {"Q_in": Q_in, "pressure": pressure, "recovery": recovery}
+                row["termination"] = str(results.solver.termination_condition)
+                if check_optimal_termination(results):
+                    row.update(_sweep_row(m, free_ion))
+                    last_good = to_json(m, return_dict=True, wts=StoreSpec.value())
+                elif last_good is not None:
+                    from_json(m, sd=last_good, wts=StoreSpec.value())
+                    # from_json restores values only, re-apply this point's inputs
+                    _set_feed_water(m, Q_in)
+                    m.fs.P1.outlet.pressure[0].fix(pressure)
+                rows.append(row)
+            forward = not forward
+
+    return pd.DataFrame(rows)
 
 
 def main():
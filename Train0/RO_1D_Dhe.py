@@ -17,6 +17,7 @@ from pyomo.environ import (
     TransformationFactory,
     units as pyunits,
     assert_optimal_termination,
+    check_optimal_termination,
     Block,
     Objective,
     Expression
@@ -24,8 +25,10 @@ from pyomo.environ import (
 
 import numpy as np
 import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pyomo.environ import units as pyunits
-import pandas as pd
 
 from pyomo.network import Arc
 from idaes.core import FlowsheetBlock
@@ -50,27 +53,82 @@ from watertap.core.wt_database import Database
 import watertap.property_models.seawater_prop_pack as prop_SW
 import time
 import idaes.logger as idaeslog
-from NF_ZO import nanofiltration
+from NF_ZO import solve_nanofiltration
 
 sys.path.append('/Users/nicktiwari/Documents/prommis/src/')
 from prommis.uky.costing.ree_plant_capcost import QGESSCosting, QGESSCostingData
 
-def RO_1D_Dhe(process_variable = "recovery", process_value = 0.2, vis=False):
-
-    # Check to see if recovery is between 0 and 1
-    # get solver
-    solver = get_solver()
-
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sweep_store import SweepStore, config_hash, describe_error
+from profiling import phase
+from auto_scaling import autoscale, feed_flows, set_flow_scaling
+from solver_stats import record_solve, take_solver_stats
+from persistent_solver import attach_persistent_solver, attached_solver
+from stream_export import append_stream_table
+from qgess_costing import build_qgess_costing
+
+def build_RO_1D_Dhe(solver=None, profiler=None, persistent=False):
+    """
+    Build, initialize and simulate the seawater RO flowsheet, then leave it set
+    up for LCOW optimization (area, pump pressure and length unfixed, QGESS
+    costing and objective attached). The sweep variable still has to be fixed
+    with fix_process_variable before the optimization solve.
+
+    With persistent=True a persistent IPOPT interface is attached to the model
+    once the objective exists and is used for every later solve of it instead
+    of solver; the square simulation solve always uses solver.
+    """
+    if solver is None:
+        solver = get_solver()
+        solver.options['max_iter'] = 100000
+
+    with phase(profiler, "build"):
+        m = _build_flowsheet()
+    with phase(profiler, "initialize"):
+        _initialize_flowsheet(m, profiler)
+    with phase(profiler, "simulation_solve"):
+        results = record_solve(m, solver, tee=True, label="simulation")
+    with phase(profiler, "optimization_set_up"):
+        _set_up_optimization(m)
+    if persistent:
+        # APPSI needs the objective, which _set_up_optimization adds
+        attach_persistent_solver(m, {"max_iter": 100000})
+
+    return m, results
+
+
+# the built, initialized, simulated and costed flowsheet of this process
+_costed_template = {}
+
+
+def costed_model(solver=None, profiler=None, persistent=False):
+    """
+    A clone of this process's costed RO flowsheet, left like build_RO_1D_Dhe
+    leaves a new one, and the simulation results of the template.
+
+    The template is built once per process, so later sweep points neither
+    rebuild and initialize the flowsheet nor construct and initialize its
+    QGESS costing again. Solver statistics of the template build are not
+    carried into the clones.
+    """
+    if "model" not in _costed_template:
+        m, results = build_RO_1D_Dhe(solver, profiler)
+        take_solver_stats(m)
+        _costed_template["model"] = m
+        _costed_template["results"] = results
+    with phase(profiler, "clone"):
+        m = _costed_template["model"].clone()
+    if persistent:
+        attach_persistent_solver(m, {"max_iter": 100000})
+    return m, _costed_template["results"]
+
+
+def _build_flowsheet():
     # setup flowsheet
     m = ConcreteModel()
     m.fs = FlowsheetBlock(dynamic=False)
     m.fs.prop_desal = prop_SW.SeawaterParameterBlock()
 
-    # Nanofiltration
-    m2 = ConcreteModel()
-    m2.fs = FlowsheetBlock(dynamic=False)
-    nanofiltration(m2)
-
     # costing
     m.fs.costing2 = QGESSCosting()
     m.fs.costing = WaterTAPCosting()
@@ -125,28 +183,31 @@ def RO_1D_Dhe(process_variable = "recovery", process_value = 0.2, vis=False):
     m.fs.RO.permeate.pressure[0].fix(pressure_atmospheric)
     m.fs.RO.length.fix(16)
 
-    # scaling
-    m.fs.prop_desal.set_default_scaling("flow_mass_phase_comp", 1e-3, index=("Liq", "H2O"))
-    m.fs.prop_desal.set_default_scaling(
-        "flow_mass_phase_comp", 1e-2, index=("Liq", "TDS")
-    )
+    # scaling, the inverse of the order of magnitude of each feed flow
+    set_flow_scaling(m.fs.prop_desal, feed_flows(m.fs.feed.properties[0]))
     iscale.set_scaling_factor(m.fs.P1.control_volume.work, 1e-3)
     iscale.set_scaling_factor(m.fs.RO.area, 1e-5)
 
     iscale.calculate_scaling_factors(m)
 
+    return m
+
+
+def _initialize_flowsheet(m, profiler=None):
     # initialize
-    m.fs.feed.initialize()
+    with phase(profiler, "fs.feed.initialize"):
+        m.fs.feed.initialize()
     propagate_state(m.fs.s01)
-    m.fs.P1.initialize()
+    with phase(profiler, "fs.P1.initialize"):
+        m.fs.P1.initialize()
     propagate_state(m.fs.s02)
-    m.fs.RO.initialize(outlvl=idaeslog.DEBUG)
+    with phase(profiler, "fs.RO.initialize"):
+        m.fs.RO.initialize(outlvl=idaeslog.DEBUG)
+    with phase(profiler, "autoscale"):
+        autoscale(m)
 
 
-    # solve model
-    solver.options['max_iter'] = 100000
-    results = solver.solve(m, tee=True)
-
+def _set_up_optimization(m):
     #Start optimizing
     m.fs.RO.area.unfix()                  # membrane area (m^2)
     m.fs.P1.outlet.pressure[0].unfix()     # feed pressure (Pa)
@@ -155,113 +216,90 @@ def RO_1D_Dhe(process_variable = "recovery", process_value = 0.2, vis=False):
     m.fs.RO.area.setub(None)
     m.fs.P1.outlet.pressure[0].setlb(1e5)
     m.fs.P1.outlet.pressure[0].setub(None)
-    CE_index_year = "UKy_2019"
-
-    fix_variable = {
-        "area": m.fs.RO.area.fix,
-        "recovery": m.fs.RO.recovery_vol_phase[0,'Liq'].fix, 
-    }
-
-    fix_variable[process_variable](process_value)
-
-    m.fs.land_cost = 1
-    # Expression(
-    #     expr=0.303736
-    #     * 1e-6
-    #     * getattr(units, "MUSD_" + CE_index_year)
-    #     / units.ton
-    #     * units.convert(m.fs.pump.flow_vol, to_units=units.ton / units.hr)
-    #     * hours_per_shift
-    #     * units.hr
-    #     * shifts_per_day
-    #     * units.day**-1
-    #     * operating_days_per_year
-    #     * units.day
-    # )
-
-    m.fs.costing2.build_process_costs(
-        # arguments related to installation costs
-        piping_materials_and_labor_percentage=20,
-        electrical_materials_and_labor_percentage=20,
-        instrumentation_percentage=8,
-        plants_services_percentage=10,
-        process_buildings_percentage=40,
-        auxiliary_buildings_percentage=15,
-        site_improvements_percentage=10,
-        equipment_installation_percentage=17,
-        field_expenses_percentage=12,
-        project_management_and_construction_percentage=30,
-        process_contingency_percentage=15,
-        # argument related to Fixed OM costs
-        labor_types=[
-            "skilled",
-            "unskilled",
-            "supervisor",
-            "maintenance",
-            "technician",
-            "engineer",
-        ],
-        labor_rate=[24.98, 19.08, 30.39, 22.73, 21.97, 45.85],  # USD/hr
-        labor_burden=25,  # % fringe benefits
-        operators_per_shift=[4, 9, 2, 2, 2, 3],
-        hours_per_shift=8,
-        shifts_per_day=3,
-        operating_days_per_year=336,
-        mixed_product_sale_price_realization_factor=0.65,  # 65% price realization for mixed products
-        # arguments related to total owners costs
-        land_cost=m.fs.land_cost,
-        resources=[],
-        rates=[],
-        fixed_OM=True,
-        variable_OM=True,
-        feed_input=None,
-        efficiency=0.80,  # power usage efficiency, or fixed motor/distribution efficiency
-        waste=[],
-        recovery_rate_per_year=None,
-        CE_index_year="UKy_2019",
-        watertap_blocks = [m.fs.RO, m.fs.P1]
-
-    )
+    build_qgess_costing(m.fs, [m.fs.RO, m.fs.P1], land_cost=1)
 
     denominator = pyunits.convert(m.fs.RO.mixed_permeate[0].flow_vol, to_units=pyunits.m**3 / pyunits.year)
     m.fs.costing.prommis_LCOW = Expression(expr=m.fs.costing2.annualized_cost / denominator * 1e6)
 
-    QGESSCostingData.costing_initialization(m.fs.costing2)
-    QGESSCostingData.initialize_fixed_OM_costs(m.fs.costing2)
-
     # consistent units
     assert_units_consistent(m)
 
-    # optimize
     m.fs.objective = Objective(expr=m.fs.costing.prommis_LCOW)
-    optimization_results = solver.solve(m)
-    nf_results = solver.solve(m2)
+
+
+def fix_process_variable(m, process_variable, process_value):
+    # only the swept variable is fixed, the other one is left to the optimizer
+    if process_variable == "area":
+        m.fs.RO.recovery_vol_phase[0, 'Liq'].unfix()
+        m.fs.RO.area.fix(process_value)
+    elif process_variable == "recovery":
+        m.fs.RO.area.unfix()
+        m.fs.RO.recovery_vol_phase[0, 'Liq'].fix(process_value)
+    else:
+        raise ValueError(
+            f'process_variable must be "area" or "recovery", got {process_variable}'
+        )
+
+
+def get_results(m):
+    # Dictionary for results
+    return { "SEC": value(m.fs.costing.specific_energy_consumption),
+             "LCOW": value(m.fs.costing.prommis_LCOW),
+             "Watertap LCOW": value(m.fs.costing.LCOW),
+             "Permeate Flow": value(m.fs.RO.mixed_permeate[0].flow_vol),
+             "Brine Flow": value(m.fs.RO.feed_side.properties[0, 1].flow_vol),
+             "Pump Pressure": value(m.fs.P1.outlet.pressure[0]),
+             "Membrane Area": value(m.fs.RO.area),
+             "Recovery": value(m.fs.RO.recovery_vol_phase[0,'Liq']),
+             "Variable OM Cost": value(m.fs.costing2.total_variable_OM_cost[0]),
+             "Fixed OM Cost": value(m.fs.costing2.total_fixed_OM_cost),
+             "Solver Stats": take_solver_stats(m),
+             }
+
+
+def RO_1D_Dhe(process_variable = "recovery", process_value = 0.2, vis=False, include_nf=True, profiler=None, persistent=False, run_id=None, use_template=False, report_tag=None):
+
+    # Check to see if recovery is between 0 and 1
+    # get solver
+    solver = get_solver()
+    solver.options['max_iter'] = 100000
+
+    # use_template clones the costed flowsheet kept by this process instead of
+    # building a new one (see costed_model)
+    if use_template:
+        m, results = costed_model(solver, profiler, persistent)
+    else:
+        m, results = build_RO_1D_Dhe(solver, profiler, persistent)
+    fix_process_variable(m, process_variable, process_value)
+
+    # optimize
+    with phase(profiler, "optimization_solve"):
+        optimization_results = record_solve(
+            m, attached_solver(m, solver), label="optimization"
+        )
+    if include_nf:
+        # Nanofiltration inputs do not change across a sweep, so this is cached
+        with phase(profiler, "nanofiltration"):
+            nf_results = solve_nanofiltration()
     assert_optimal_termination(results)
 
-    QGESSCostingData.report(m.fs.costing2, export=True)
+    if report_tag is None:
+        QGESSCostingData.report(m.fs.costing2, export=True)
+    else:
+        _export_costing_report(m, report_tag)
     QGESSCostingData.display_flowsheet_cost(m.fs.costing2)
 
     #print
     m.fs.feed.report()
     m.fs.P1.report()
     m.fs.RO.report()
-    df = m.fs.RO._get_stream_table_contents()
-    pd.options.display.float_format = '{:,.10f}'.format
-    df.to_csv('stream_table_contents.csv', index=False, float_format='%.10f')
+    run_id = append_stream_table(
+        m.fs.RO._get_stream_table_contents(), run_id, source="RO_1D_Dhe"
+    )
 
 
-    # Dictionary for results
-    results = { "SEC": value(m.fs.costing.specific_energy_consumption),
-                "LCOW": value(m.fs.costing.prommis_LCOW),
-                "Watertap LCOW": value(m.fs.costing.LCOW),
-                "Permeate Flow": value(m.fs.RO.mixed_permeate[0].flow_vol),
-                "Brine Flow": value(m.fs.RO.feed_side.properties[0, 1].flow_vol),
-                "Pump Pressure": value(m.fs.P1.outlet.pressure[0]),
-                "Membrane Area": value(m.fs.RO.area),
-                "Recovery": value(m.fs.RO.recovery_vol_phase[0,'Liq']),
-                "Variable OM Cost": value(m.fs.costing2.total_variable_OM_cost[0]),
-                "Fixed OM Cost": value(m.fs.costing2.total_fixed_OM_cost),
-                }
+    results = get_results(m)
+    results["Run ID"] = run_id
 
 
     print("Permeate flow (m3/s): " + "{:.4f}".format(value(m.fs.RO.mixed_permeate[0].flow_vol)))
@@ -297,6 +335,199 @@ def RO_1D_Dhe(process_variable = "recovery", process_value = 0.2, vis=False):
 
     return results
 
+
+def _export_costing_report(m, tag):
+    # QGESS exports its report under a fixed file name in the working
+    # directory, so concurrent sweep points would overwrite each other. Export
+    # into a scratch directory and move the files to names carrying the tag.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(dir=cwd) as tmp:
+        os.chdir(tmp)
+        try:
+            QGESSCostingData.report(m.fs.costing2, export=True)
+        finally:
+            os.chdir(cwd)
+        for name in os.listdir(tmp):
+            stem, ext = os.path.splitext(name)
+            os.replace(os.path.join(tmp, name), f"{stem}_{tag}{ext}")
+
+
+def continuation_sweep(process_variable, process_values, store=None, persistent=False):
+    """
+    Sweep RO_1D_Dhe by building and initializing the flowsheet once and then
+    re-fixing the process variable and re-solving from the previous optimum.
+    With persistent=True the re-solves go through a persistent IPOPT interface
+    attached to the model (see build_RO_1D_Dhe).
+
+    A fresh model (a clone of the costed template, see costed_model) is only
+    taken when a warm solve fails. Points that still fail after that are
+    stored as {"error": message} and the next point starts from a fresh
+    model. Results are keyed like multiple(). Points already completed in an
+    optional SweepStore are skipped.
+    """
+    solver = get_solver()
+    solver.options['max_iter'] = 100000
+
+    sweep_config = _sweep_config(process_variable, include_nf=False, persistent=persistent)
+    completed = store.completed(sweep_config) if store is not None else {}
+
+    results = {}
+    m = None
+    for process_value in process_values:
+        key = _result_key(process_variable, process_value)
+        if key in completed:
+            results[key] = completed[key]
+            continue
+
+        results[key] = _continuation_point(
+            m, solver, process_variable, process_value, persistent
+        )
+        m = results[key].pop("_model", None)
+        if store is not None:
+            store.append(sweep_config, key, results[key], encoder=NpEncoder)
+
+    return results
+
+
+def _continuation_point(m, solver, process_variable, process_value, persistent=False):
+    # Solve one continuation point, warm if a model is available. The model to
+    # carry forward is returned under "_model" (absent after a failure).
+    failed_stats = []
+    if m is not None:
+        try:
+            fix_process_variable(m, process_variable, process_value)
+            warm_results = record_solve(m, attached_solver(m, solver), label="warm")
+            if check_optimal_termination(warm_results):
+                return dict(get_results(m), _model=m)
+            reason = str(warm_results.solver.termination_condition)
+        except Exception as err:
+            reason = describe_error(err)
+        failed_stats = take_solver_stats(m)
+        print(
+            f"Warm solve failed at {process_variable}={process_value} ({reason}), rebuilding"
+        )
+
+    try:
+        m, _ = costed_model(solver, persistent=persistent)
+        fix_process_variable(m, process_variable, process_value)
+        optimization_results = record_solve(
+            m, attached_solver(m, solver), label="optimization"
+        )
+    except Exception as err:
+        return {"error": describe_error(err), "Solver Stats": failed_stats}
+
+    if check_optimal_termination(optimization_results):
+        results = get_results(m)
+        results["Solver Stats"] = failed_stats + results["Solver Stats"]
+        return dict(results, _model=m)
+    return {
+        "error": f"solve failed: {optimization_results.solver.termination_condition}",
+        "Solver Stats": failed_stats + take_solver_stats(m),
+    }
+
+def _interior_deviation(points, name):
+    # Distance of every interior point from the straight line through its
+    # neighbours, relative to the range of the curve. Large values mark where
+    # the curve bends and a uniform grid would be too coarse.
+    ys = [result[name] for _, result in points]
+    span = max(ys) - min(ys)
+    deviations = []
+    for i in range(1, len(points) - 1):
+        (xa, _), (xi, _), (xc, _) = points[i - 1], points[i], points[i + 1]
+        ya, yi, yc = ys[i - 1], ys[i], ys[i + 1]
+        y_line = ya + (yc - ya) * (xi - xa) / (xc - xa)
+        deviations.append((abs(yi - y_line) / span if span > 0 else 0.0, i))
+    return deviations
+
+
+def _refinement_candidates(points, x_tol, curve_tol):
+    # points are the feasible (x, result) pairs sorted by x
+    candidates = []
+    if len(points) < 3:
+        return candidates
+
+    # golden-section step inside the bracket around the LCOW minimum
+    i = min(range(len(points)), key=lambda k: points[k][1]["LCOW"])
+    lo = points[max(i - 1, 0)][0]
+    hi = points[min(i + 1, len(points) - 1)][0]
+    x_min = points[i][0]
+    if hi - lo > x_tol:
+        far = lo if (x_min - lo) > (hi - x_min) else hi
+        candidates.append(x_min + 0.381966 * (far - x_min))
+
+    # bisect next to the most strongly bending point of the LCOW or SEC curve
+    deviations = _interior_deviation(points, "LCOW") + _interior_deviation(points, "SEC")
+    if deviations:
+        deviation, i = max(deviations)
+        if deviation > curve_tol:
+            xa, xi, xc = points[i - 1][0], points[i][0], points[i + 1][0]
+            if xi - xa >= xc - xi:
+                candidates.append(0.5 * (xa + xi))
+            else:
+                candidates.append(0.5 * (xi + xc))
+
+    return candidates
+
+
+def adaptive_sweep(
+    process_variable,
+    lower,
+    upper,
+    n_initial=5,
+    x_tol=None,
+    curve_tol=0.02,
+    max_points=30,
+):
+    """
+    Sweep RO_1D_Dhe on a coarse grid and then refine only where it matters.
+
+    Every refinement round adds a golden-section point inside the bracket
+    around the LCOW minimum (until the bracket is narrower than x_tol) and a
+    bisection point next to the interior point where the LCOW or SEC curve
+    deviates most from a straight line (until that deviation, relative to the
+    curve range, drops below curve_tol). Points are solved with the same warm
+    start / rebuild logic as continuation_sweep. Stops when no new point is
+    needed or max_points solves have been done.
+
+    Returns results keyed like multiple(), sorted by process value.
+    """
+    if x_tol is None:
+        x_tol = (upper - lower) / 100
+
+    solver = get_solver()
+    solver.options['max_iter'] = 100000
+
+    evaluated = {}
+    state = {"model": None}
+
+    def evaluate(x):
+        result = _continuation_point(state["model"], solver, process_variable, x)
+        state["model"] = result.pop("_model", None)
+        evaluated[x] = result
+
+    for x in np.linspace(lower, upper, n_initial):
+        evaluate(float(x))
+
+    while len(evaluated) < max_points:
+        points = sorted(
+            (x, result) for x, result in evaluated.items() if "error" not in result
+        )
+        candidates = [
+            x
+            for x in _refinement_candidates(points, x_tol, curve_tol)
+            if all(abs(x - done) > x_tol / 2 for done in evaluated)
+        ]
+        if not candidates:
+            break
+        for x in candidates[: max_points - len(evaluated)]:
+            # the two candidates can land on top of each other
+            if all(abs(x - done) > x_tol / 2 for done in evaluated):
+                evaluate(x)
+
+    return {
+        _result_key(process_variable, x): evaluated[x] for x in sorted(evaluated)
+    }
+
 # Encoder to convert numpy objects for json serialization
 class NpEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -308,18 +539,127 @@ class NpEncoder(json.JSONEncoder):
             return obj.tolist()
         return super(NpEncoder, self).default(obj)
 
-def multiple():
+def _result_key(process_variable, process_value):
+    # every process variable is keyed by its value, so close refinement
+    # points never share a key
+    return process_value
+
+
+def _run_job(job, include_nf=True):
+    # Worker entry point for parallel_sweep; failures are returned, not raised,
+    # so one bad point does not take down the rest of the pool
+    process_variable, process_value = job
+    try:
+        return RO_1D_Dhe(
+            process_variable=process_variable,
+            process_value=process_value,
+            include_nf=include_nf,
+            use_template=True,
+            report_tag=f"{process_variable}_{_result_key(process_variable, process_value)}",
+        )
+    except Exception as err:
+        return {"error": describe_error(err)}
+
+
+def _sweep_config(process_variable, include_nf=True, persistent=False):
+    # configuration hash used to checkpoint and resume RO_1D_Dhe sweeps
+    return config_hash(
+        {
+            "flowsheet": "RO_1D_Dhe",
+            "process_variable": process_variable,
+            "include_nf": include_nf,
+            "persistent": bool(persistent),
+        }
+    )
+
+
+def parallel_sweep(jobs, max_workers=None, include_nf=True, store=None):
+    """
+    Run RO_1D_Dhe over a list of (process_variable, process_value) jobs in a
+    process pool.
+
+    Results are returned in job order, keyed the same way multiple() keys the
+    results_fixed_{process_variable}.json files. A point that raises is stored
+    as {"error": message} instead of aborting the sweep. include_nf=False
+    skips the nanofiltration solve on every point.
+
+    If a SweepStore is given, every point is appended to it as soon as it
+    finishes and points already completed in the store are not re-run.
+    """
+    jobs = [(pv, float(val)) for pv, val in jobs]
+
+    outputs = {}
+    pending = []
+    completed = {}
+    for job in jobs:
+        process_variable, process_value = job
+        if store is not None:
+            if process_variable not in completed:
+                completed[process_variable] = store.completed(
+                    _sweep_config(process_variable, include_nf)
+                )
+            key = _result_key(process_variable, process_value)
+            if key in completed[process_variable]:
+                outputs[job] = completed[process_variable][key]
+                continue
+        pending.append(job)
+
+    def record(job, output):
+        outputs[job] = output
+        if store is not None:
+            store.append(
+                _sweep_config(job[0], include_nf),
+                _result_key(*job),
+                output,
+                encoder=NpEncoder,
+            )
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(pending)))
+
+    if max_workers == 1:
+        for job in pending:
+            record(job, _run_job(job, include_nf))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_run_job, job, include_nf): job for job in pending}
+            # checkpoint in completion order, the returned dict is in job order
+            for future in as_completed(futures):
+                try:
+                    output = future.result()
+                except Exception as err:  # e.g. a worker killed by the solver
+                    output = {"error": describe_error(err)}
+                record(futures[future], output)
+
+    results = {}
+    for job in jobs:
+        results[_result_key(*job)] = outputs[job]
+    return results
+
+
+def multiple(max_workers=None, continuation=False, store_file=None, persistent=False):
 
     process_variable = "recovery"
     process_value = np.arange(0.2, 0.6, 0.05)
-    results = {}
 
-    for pv in process_value:
-        result = RO_1D_Dhe(process_variable=process_variable, process_value=pv)
-        if process_value == "area":
-            results[int(pv)] = result
-        else:
-            results[pv] = result
+    # checkpoint every point so an interrupted sweep can be resumed
+    store = SweepStore(store_file) if store_file is not None else None
+
+    jobs = [(process_variable, pv) for pv in process_value]
+    if continuation:
+        results = continuation_sweep(
+            process_variable,
+            [float(pv) for pv in process_value],
+            store=store,
+            persistent=persistent,
+        )
+    else:
+        results = parallel_sweep(jobs, max_workers=max_workers, store=store)
+
+    failed = [key for key, result in results.items() if "error" in result]
+    if failed:
+        print(f"{len(failed)} of {len(jobs)} sweep points failed: {failed}")
 
     # write results to json files
     with open(f'results_fixed_{process_variable}.json', 'w') as f:
@@ -0,0 +1,82 @@
+# Scaling factors derived from the model instead of hard-coded constants.
+#
+# Default flow scaling is set from the feed specification before
+# calculate_scaling_factors(), and autoscale() is run once the flowsheet is
+# initialized: it rescales the variables IDAES reports as badly scaled and the
+# constraints it reports as unscaled, from their current values, until both
+# checks come back clean (or max_passes is reached).
+import math
+
+from pyomo.core.expr.visitor import identify_variables
+from pyomo.environ import value
+
+import idaes.core.util.scaling as iscale
+
+
+def order_of_magnitude_scale(number, default=1):
+    """10**-floor(log10(|number|)), or default for zero or None."""
+    if number is None or number == 0:
+        return default
+    return 10 ** (-math.floor(math.log10(abs(number))))
+
+
+def set_flow_scaling(property_package, flows, phase="Liq", default=1):
+    """
+    Default flow_mass_phase_comp scaling on a property package from a
+    {component: feed mass flow} dict.
+    """
+    for comp, flow in flows.items():
+        property_package.set_default_scaling(
+            "flow_mass_phase_comp",
+            order_of_magnitude_scale(flow, default),
+            index=(phase, comp),
+        )
+
+
+def feed_flows(state_block, phase="Liq"):
+    """{component: mass flow} of an initialized state block."""
+    return {
+        comp: value(state_block.flow_mass_phase_comp[p, comp])
+        for p, comp in state_block.flow_mass_phase_comp.index_set()
+        if p == phase
+    }
+
+
+def _constraint_scale(con, default=1):
+    # scale a constraint by the largest value among its variables
+    values = [abs(v.value) for v in identify_variables(con.body) if v.value is not None]
+    return order_of_magnitude_scale(max(values, default=0), default)
+
+
+def autoscale(m, max_passes=3, large=1e4, small=1e-3, zero=1e-10, verbose=False):
+    """
+    Rescale badly scaled variables and unscaled constraints of an
+    initialized model, or of one block of it, and recompute the scaling
+    factors.
+
+    Returns the number of badly scaled variables and unscaled constraints
+    left after the last pass.
+    """
+    bad, unscaled = [], []
+    for n in range(max_passes + 1):
+        bad = [
+            var
+            for var, _ in iscale.badly_scaled_var_generator(
+                m, large=large, small=small, zero=zero
+            )
+            if var.value is not None and abs(var.value) > zero
+        ]
+        unscaled = list(iscale.unscaled_constraints_generator(m))
+        if verbose:
+            print(
+                f"autoscale pass {n}: {len(bad)} badly scaled variables, "
+                f"{len(unscaled)} unscaled constraints"
+            )
+        if (not bad and not unscaled) or n == max_passes:
+            break
+        for var in bad:
+            iscale.set_scaling_factor(var, order_of_magnitude_scale(var.value))
+        for con in unscaled:
+            iscale.set_scaling_factor(con, _constraint_scale(con))
+        iscale.calculate_scaling_factors(m)
+    return len(bad), len(unscaled)
@@ -11,7 +11,7 @@ from pyomo.environ import (
     units
 )
 import json
-import math
+import os
 import sys
 from pyomo.network import Arc
 from idaes.core import FlowsheetBlock
@@ -36,9 +36,15 @@ from idaes.core.util.scaling import (
 )
 
 sys.path.append('/Users/nicktiwari/Documents/prommis/src/')
-from prommis.uky.costing.ree_plant_capcost import QGESSCosting, QGESSCostingData
 
-def nanofiltration(m, Q_in = 100):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from auto_scaling import autoscale, feed_flows, set_flow_scaling
+from nf_analytic import nanofiltration_analytic
+from stream_export import append_stream_table, excel_report
+from qgess_costing import build_qgess_costing
+from prommis.uky.costing.ree_plant_capcost import QGESSCostingData
+
+def nanofiltration(m, Q_in = 100, free_ion = "Cl"):
     # Read data from 'solute_parameters.json'
     with open("../solute_parameters.json") as f:
         solute_data = json.load(f)
@@ -87,13 +93,23 @@ def nanofiltration(m, Q_in = 100):
 
     # fully specify system
     m.fs.unit2.properties_permeate[0].pressure.fix(101325)
-    m.fs.unit2.recovery_vol_phase.fix(0.5)
+    recovery = 0.5
+    m.fs.unit2.recovery_vol_phase.fix(recovery)
 
     for key in solute_list:
-        if key != "Cl":
+        if key != free_ion:
             m.fs.unit2.rejection_phase_comp[0, "Liq", key].fix(solute_data[key]['rejection_phase_comp'])
 
-    m.fs.unit2.rejection_phase_comp[0, "Liq", "Cl"] = 0.15  # guess, but electroneutrality enforced below
+    # pre-solve: the free ion rejection that makes the retentate electroneutral,
+    # so the unit is initialized from a consistent point (enforced below)
+    presolve = nanofiltration_analytic(
+        Q_in,
+        [solute_data[key]['mass_flow'] for key in solute_list],
+        solute_data,
+        free_ion=free_ion,
+        recovery=recovery,
+    )
+    m.fs.unit2.rejection_phase_comp[0, "Liq", free_ion] = float(presolve[f"{free_ion} Rejection"][0])
     charge_comp = {key: solute_data[key]['charge'] for key in solute_list}
 
     m.fs.unit2.eq_electroneutrality = Constraint(
@@ -106,23 +122,8 @@ def nanofiltration(m, Q_in = 100):
     )
     constraint_scaling_transform(m.fs.unit2.eq_electroneutrality, 1)
 
-    def inverse_order_of_magnitude(number):
-        if number == 0:
-            return "undefined"  # The order of magnitude for zero is undefined
-        magnitude = math.floor(math.log10(abs(number)))
-        return 10**(-magnitude)
-
-    # scaling
-    m.fs.properties2.set_default_scaling(
-        "flow_mass_phase_comp", 1e-2, index=("Liq", "H2O")
-    )
-
-    # Set the scaling to be the inverse of the order of magnitude of the mass concentration
-    for key in solute_list:
-        m.fs.properties2.set_default_scaling(
-            "flow_mass_phase_comp", inverse_order_of_magnitude(solute_data[key]['mass_flow']), index=("Liq", key)
-         )
-
+    # scaling, the inverse of the order of magnitude of each feed flow
+    set_flow_scaling(m.fs.properties2, feed_flows(m.fs.feed2.properties[0]))
 
     iscale.set_scaling_factor(m.fs.P1.control_volume.work, 1e-3)
 
@@ -139,59 +140,18 @@ def nanofiltration(m, Q_in = 100):
     propagate_state(m.fs.s04)
     m.fs.disposal2.initialize()
 
+    # only the NF blocks: when embedded in the LSRRO flowsheet the rest of m is
+    # not initialized yet and is autoscaled after its own initialization
+    for blk in (m.fs.feed2, m.fs.P1, m.fs.unit2, m.fs.product2, m.fs.disposal2):
+        autoscale(blk)
+
     return m
 
 def qgess_costing(m):
-    m.fs.costing2 = QGESSCosting()
-    CE_index_year = "UKy_2019"
-    m.fs.land_cost = 1
-    m.fs.costing2.build_process_costs(
-    # arguments related to installation costs
-        piping_materials_and_labor_percentage=20,
-        electrical_materials_and_labor_percentage=20,
-        instrumentation_percentage=8,
-        plants_services_percentage=10,
-        process_buildings_percentage=40,
-        auxiliary_buildings_percentage=15,
-        site_improvements_percentage=10,
-        equipment_installation_percentage=17,
-        field_expenses_percentage=12,
-        project_management_and_construction_percentage=30,
-        process_contingency_percentage=15,
-        # argument related to Fixed OM costs
-        labor_types=[
-            "skilled",
-            "unskilled",
-            "supervisor",
-            "maintenance",
-            "technician",
-            "engineer",
-        ],
-        labor_rate=[24.98, 19.08, 30.39, 22.73, 21.97, 45.85],  # USD/hr
-        labor_burden=25,  # % fringe benefits
-        operators_per_shift=[4, 9, 2, 2, 2, 3],
-        hours_per_shift=8,
-        shifts_per_day=3,
-        operating_days_per_year=336,
-        mixed_product_sale_price_realization_factor=0.65,  # 65% price realization for mixed products
-        # arguments related to total owners costs
-        land_cost=m.fs.land_cost,
-        resources=[],
-        rates=[],
-        fixed_OM=True,
-        variable_OM=True,
-        feed_input=None,
-        efficiency=0.80,  # power usage efficiency, or fixed motor/distribution efficiency
-        waste=[],
-        recovery_rate_per_year=None,
-        CE_index_year="UKy_2019",
-        watertap_blocks = [m.fs.unit2, m.fs.P1]
-    )
-    QGESSCostingData.costing_initialization(m.fs.costing2)
-    QGESSCostingData.initialize_fixed_OM_costs(m.fs.costing2)
+    build_qgess_costing(m.fs, [m.fs.unit2, m.fs.P1], land_cost=1)
 
 
-def main():
+def main(excel=False):
     model = ConcreteModel()
     model.fs = FlowsheetBlock(dynamic=False)
     nanofiltration(model)
@@ -202,7 +162,9 @@ def main():
     QGESSCostingData.display_flowsheet_cost(model.fs.costing2)
 
     model.fs.unit2.report()
-    model.fs.unit2._get_stream_table_contents().to_excel("NF_ZO.xlsx", sheet_name="NF_ZO")
+    run_id = append_stream_table(model.fs.unit2._get_stream_table_contents(), source="NF_ZO")
+    if excel:
+        excel_report("NF_ZO.xlsx", run_ids=[run_id])
 
 if __name__ == "__main__":
     main()
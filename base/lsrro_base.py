@@ -11,7 +11,10 @@
 # "https://github.com/watertap-org/watertap/"
 #################################################################################
 
+import hashlib
+import inspect
 import itertools
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import numpy as np
 from pyomo.environ import (
     ConcreteModel,
@@ -29,6 +32,13 @@ from pyomo.environ import (
     check_optimal_termination,
     units as pyunits,
 )
+from pyomo.common.collections import ComponentMap, ComponentSet
+from pyomo.core.expr.visitor import identify_variables
+from pyomo.util.calc_var_value import calculate_variable_from_constraint
+from pyomo.util.subsystems import TemporarySubsystemManager
+from pyomo.core.base.componentuid import ComponentUID
+from pyomo.dae import DerivativeVar
+from pyomo.dae.flatten import flatten_dae_components
 from pyomo.network import Arc, SequentialDecomposition
 from pyomo.util.check_units import assert_units_consistent
 
@@ -37,6 +47,7 @@ from watertap.core.solvers import get_solver
 from idaes.core.util.exceptions import InitializationError
 from idaes.core.util.initialization import propagate_state
 from idaes.core.util.misc import StrEnum
+from idaes.core.util.model_serializer import StoreSpec, from_json, to_json
 from idaes.models.unit_models import Feed, Product, Mixer
 from idaes.models.unit_models.mixer import MomentumMixingType
 import idaes.core.util.scaling as iscale
@@ -62,11 +73,29 @@ from watertap.costing import (
 import watertap.property_models.seawater_prop_pack as props
 
 from NF_ZO import nanofiltration
+from state_columns import StateColumns
 
+import os
 import sys
+
+try:
+    # cloudpickle can serialize the rule closures IDAES models carry around
+    import cloudpickle as pickle
+except ImportError:
+    import pickle
+
 sys.path.append('/Users/nicktiwari/Documents/prommis/src/')
 from prommis.uky.costing.ree_plant_capcost import QGESSCosting, QGESSCostingData
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sweep_store import SweepStore, config_hash, describe_error
+from profiling import phase
+from auto_scaling import autoscale, feed_flows, set_flow_scaling
+from solver_stats import record_solve, solve_with_stats
+from qgess_costing import build_qgess_costing
+from lcow_scenarios import in_costing_block
+from persistent_solver import attach_persistent_solver, attached_solver
+
 class ACase(StrEnum):
     fixed = "fixed"
     optimize = "optimize"
@@ -101,51 +130,484 @@ def run_lsrro_case(
     B_max=None,
     number_of_RO_finite_elements=10,
     set_default_bounds_on_module_dimensions=True,
+    store=None,
+    use_build_cache=False,
+    build_cache_dir=None,
+    init_cache_dir=None,
+    guess_predictor=None,
+    profiler=None,
+    persistent_solver=False,
+    lean=False,
+    decomposed=False,
 ):
-    m = build(
-        number_of_stages,
-        has_NaCl_solubility_limit,
-        has_calculated_concentration_polarization,
-        has_calculated_ro_pressure_drop,
-        number_of_RO_finite_elements,
-        B_max,
-    )
-    set_operating_conditions(m, Cin, Qin)
+    case = dict(locals())
+    if store is not None:
+        case_config = config_hash(_lsrro_case_kwargs(**case))
 
-    initialize(m)
-    solve(m)
-    print("\n***---Simulation results---***")
-    display_system(m)
-    display_design(m)
-    display_state(m)
+    m = _set_up_lsrro_case(case, profiler=profiler)
 
-    optimize_set_up(
-        m,
-        set_default_bounds_on_module_dimensions,
-        water_recovery,
-        Cbrine,
-        A_case,
-        B_case,
-        AB_tradeoff,
-        A_value,
-        permeate_quality_limit,
-        AB_gamma_factor,
-        B_max,
-    )
-    res = solve(m, raise_on_failure=False, tee=False)
+    with phase(profiler, "optimization_solve"):
+        res = solve(m, raise_on_failure=False, tee=False, decompose=decomposed)
     print("\n***---Optimization results---***")
     if check_optimal_termination(res):
-        display_system(m)
+        add_reporting_components(m)
+        state = StateColumns.from_model(m)
+        data = get_state_data(m, state)
+        display_system(m, data)
         display_design(m)
-        display_state(m)
-        save_state(m, filename = f'dump_{str(water_recovery)}_recov.json')
+        display_state(m, data)
+        save_state(m, filename = f'dump_{str(water_recovery)}_recov.npz', state=state, data=data)
+        if store is not None:
+            store.append(case_config, water_recovery, data)
         display_RO_reports(m)
         QGESSCostingData.report(m.fs.prommis_costing, export=True)
         QGESSCostingData.display_flowsheet_cost(m.fs.prommis_costing)
     else:
         print("\n***---Solve failed---***")
+        if store is not None:
+            store.append(
+                case_config,
+                water_recovery,
+                {
+                    "error": str(res.solver.termination_condition),
+                    "Solver Stats": list(m._solver_stats),
+                },
+            )
     return m, res
 
+
+def _set_up_lsrro_case(case, profiler=None, display=True):
+    # Build, initialize and simulate a case (a dict of run_lsrro_case
+    # arguments) and leave the model ready for the optimization solve
+    with phase(profiler, "build"):
+        m = build(
+            case["number_of_stages"],
+            case["has_NaCl_solubility_limit"],
+            case["has_calculated_concentration_polarization"],
+            case["has_calculated_ro_pressure_drop"],
+            case["number_of_RO_finite_elements"],
+            case["B_max"],
+            use_cache=case["use_build_cache"] or case["build_cache_dir"] is not None,
+            cache_dir=case["build_cache_dir"],
+            lean=case["lean"],
+        )
+    with phase(profiler, "set_operating_conditions"):
+        set_operating_conditions(m, case["Cin"], case["Qin"])
+
+    with phase(profiler, "initialize"):
+        initialize(
+            m,
+            cache_dir=case["init_cache_dir"],
+            predictor=case["guess_predictor"],
+            water_recovery=case["water_recovery"],
+            profiler=profiler,
+        )
+    with phase(profiler, "autoscale"):
+        autoscale(m)
+    if case.get("persistent_solver"):
+        # simulation and optimization re-solves skip the full NL export; the
+        # model is scaled by now, so its constraint scaling carries over
+        attach_persistent_solver(m)
+    with phase(profiler, "simulation_solve"):
+        solve(m, label="simulation", decompose=case["decomposed"])
+    # lean models only get their reporting components after the optimization
+    if display and not case["lean"]:
+        print("\n***---Simulation results---***")
+        data = get_state_data(m)
+        display_system(m, data)
+        display_design(m)
+        display_state(m, data)
+
+    with phase(profiler, "optimize_set_up"):
+        _optimize_set_up_case(m, case)
+    return m
+
+
+def _optimize_set_up_case(m, case):
+    optimize_set_up(
+        m,
+        case["set_default_bounds_on_module_dimensions"],
+        case["water_recovery"],
+        case["Cbrine"],
+        case["A_case"],
+        case["B_case"],
+        case["AB_tradeoff"],
+        case["A_value"],
+        case["permeate_quality_limit"],
+        case["AB_gamma_factor"],
+        case["B_max"],
+    )
+
+
+def _lsrro_case_arguments(**case_kwargs):
+    # run_lsrro_case arguments with defaults filled in
+    bound = inspect.signature(run_lsrro_case).bind_partial(**case_kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def _lsrro_case_kwargs(**case_kwargs):
+    # run_lsrro_case arguments with defaults filled in, minus the swept recovery
+    kwargs = _lsrro_case_arguments(**case_kwargs)
+    # arguments that do not change the result
+    for name in (
+        "water_recovery",
+        "store",
+        "use_build_cache",
+        "build_cache_dir",
+        "init_cache_dir",
+        "guess_predictor",
+        "profiler",
+    ):
+        kwargs.pop(name, None)
+    # solve modes reach a (possibly different) local optimum by another path,
+    # so they are part of the configuration; normalized so e.g. 1 and True
+    # hash alike
+    for name in ("lean", "decomposed", "persistent_solver"):
+        kwargs[name] = bool(kwargs.get(name, False))
+    return kwargs
+
+
+def run_lsrro_sweep(water_recoveries, store_file, **case_kwargs):
+    """
+    Run run_lsrro_case over a list of water recoveries, checkpointing the
+    get_state_data() payload of every point to a SweepStore. Recoveries that
+    are already completed in the store for the same case configuration are
+    not re-run.
+
+    Returns a dict of {water_recovery: state data} for the requested
+    recoveries that succeeded.
+    """
+    store = SweepStore(store_file)
+    config = config_hash(_lsrro_case_kwargs(**case_kwargs))
+    completed = store.completed(config)
+    for water_recovery in water_recoveries:
+        if water_recovery in completed:
+            print(f"Skipping water_recovery={water_recovery}, already completed")
+            continue
+        run_lsrro_case(water_recovery=water_recovery, store=store, **case_kwargs)
+    # run_lsrro_case stored the state data of every successful point
+    completed = store.completed(config)
+    return {wr: completed[wr] for wr in water_recoveries if wr in completed}
+
+def _perturb_design(m, perturbation, rng):
+    # Scale the starting values of the free stage pressures, areas and A/B
+    # values by a random factor in [1 - perturbation, 1 + perturbation],
+    # kept inside the variable bounds
+    variables = []
+    for pump in itertools.chain(m.fs.PrimaryPumps.values(), m.fs.BoosterPumps.values()):
+        variables.append(pump.control_volume.properties_out[0].pressure)
+    for stage in m.fs.ROUnits.values():
+        variables.append(stage.area)
+        variables.extend(stage.A_comp.values())
+        variables.extend(stage.B_comp.values())
+
+    for var in variables:
+        if var.fixed or var.value is None:
+            continue
+        val = var.value * rng.uniform(1 - perturbation, 1 + perturbation)
+        if var.lb is not None:
+            val = max(val, var.lb)
+        if var.ub is not None:
+            val = min(val, var.ub)
+        var.set_value(val)
+
+
+def _multistart_worker(case, start, perturbation, seed):
+    # Solve one start of run_lsrro_multistart; start 0 is the unperturbed
+    # initialized point
+    try:
+        m = _set_up_lsrro_case(case, display=False)
+        if start > 0:
+            _perturb_design(m, perturbation, np.random.default_rng([seed, start]))
+        res = solve(m, raise_on_failure=False, tee=False, decompose=case["decomposed"])
+    except Exception as err:
+        return {"start": start, "termination": describe_error(err)}
+
+    result = {"start": start, "termination": str(res.solver.termination_condition)}
+    if check_optimal_termination(res):
+        add_reporting_components(m)
+        result["LCOW"] = value(m.fs.prommis_costing.LCOW)
+        result["SEC"] = value(m.fs.costing.specific_energy_consumption)
+        result["state"] = get_state_data(m)
+    return result
+
+
+def run_lsrro_multistart(
+    number_of_starts=8, max_workers=None, perturbation=0.2, seed=0, **case_kwargs
+):
+    # Optimize one case from number_of_starts starting points in worker
+    # processes: start 0 is the initialized point, the others scale the free
+    # pressures, areas and A/B values by random factors within perturbation.
+    # Starts share one configuration, so the build cache is on by default.
+    # Returns (best start with its state data or None, summary dict).
+    case = _lsrro_case_arguments(**dict({"use_build_cache": True}, **case_kwargs))
+    case["store"] = None
+    case["profiler"] = None
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, number_of_starts))
+
+    args = [(case, start, perturbation, seed) for start in range(number_of_starts)]
+    if max_workers == 1:
+        starts = [_multistart_worker(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_multistart_worker, *a) for a in args]
+            starts = []
+            for start, future in enumerate(futures):
+                try:
+                    starts.append(future.result())
+                except Exception as err:  # e.g. a worker killed by the solver
+                    starts.append(
+                        {"start": start, "termination": describe_error(err)}
+                    )
+
+    feasible = [s for s in starts if "LCOW" in s]
+    lcow = np.array([s["LCOW"] for s in feasible])
+    summary = {
+        "number_of_starts": number_of_starts,
+        "number_feasible": len(feasible),
+        "LCOW_min": float(lcow.min()) if len(lcow) else None,
+        "LCOW_median": float(np.median(lcow)) if len(lcow) else None,
+        "LCOW_max": float(lcow.max()) if len(lcow) else None,
+        "starts": [{k: v for k, v in s.items() if k != "state"} for s in starts],
+    }
+    best = min(feasible, key=lambda s: s["LCOW"]) if feasible else None
+
+    print("\n***---Multi-start results---***")
+    print(f"Feasible starts: {len(feasible)} of {number_of_starts}")
+    if best is not None:
+        print(
+            "LCOW (PROMMIS) min / median / max: %.4f / %.4f / %.4f $/m3"
+            % (summary["LCOW_min"], summary["LCOW_median"], summary["LCOW_max"])
+        )
+        print(f"Best start: {best['start']}")
+    return best, summary
+
+
+def _stage_scan_worker(case):
+    # Optimize one stage count for scan_stage_counts
+    n = case["number_of_stages"]
+    try:
+        m = _set_up_lsrro_case(case, display=False)
+        res = solve(m, raise_on_failure=False, tee=False, decompose=case["decomposed"])
+    except Exception as err:
+        return {"number_of_stages": n, "termination": describe_error(err)}
+
+    result = {"number_of_stages": n, "termination": str(res.solver.termination_condition)}
+    if check_optimal_termination(res):
+        add_reporting_components(m)
+        result["LCOW"] = value(m.fs.prommis_costing.LCOW)
+        result["SEC"] = value(m.fs.costing.specific_energy_consumption)
+        result["total_membrane_area"] = value(m.fs.total_membrane_area)
+    return result
+
+
+def scan_stage_counts(
+    max_stages, max_workers=None, rel_tol=1e-3, window=2, **case_kwargs
+):
+    # Optimize 1..max_stages stages in worker processes, at most window at a
+    # time, in stage order. Stops launching once the LCOW improves by less
+    # than rel_tol, or a stage count fails after a feasible one, and cancels
+    # stage counts that have not started. Returns per-stage result dicts.
+    if "number_of_stages" in case_kwargs:
+        raise ValueError(
+            "scan_stage_counts sets number_of_stages itself, pass max_stages instead"
+        )
+    case = _lsrro_case_arguments(number_of_stages=1, **case_kwargs)
+    case["store"] = None
+    case["profiler"] = None
+
+    in_flight = window if max_workers is None else min(window, max_workers)
+    in_flight = max(1, min(in_flight, max_stages))
+
+    results = {}
+    best_lcow = None
+    stop = False
+    next_launch = 1
+    next_check = 1
+    with ProcessPoolExecutor(max_workers=in_flight) as executor:
+        running = {}
+        while True:
+            while not stop and next_launch <= max_stages and len(running) < in_flight:
+                future = executor.submit(
+                    _stage_scan_worker, dict(case, number_of_stages=next_launch)
+                )
+                running[future] = next_launch
+                next_launch += 1
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                n = running.pop(future)
+                try:
+                    results[n] = future.result()
+                except Exception as err:  # e.g. a worker killed by the solver
+                    results[n] = {
+                        "number_of_stages": n,
+                        "termination": describe_error(err),
+                    }
+
+            # apply the stopping rule in stage order
+            while not stop and next_check in results:
+                lcow = results[next_check].get("LCOW")
+                if lcow is None:
+                    stop = best_lcow is not None
+                elif best_lcow is not None and lcow >= best_lcow * (1 - rel_tol):
+                    stop = True
+                else:
+                    best_lcow = lcow
+                next_check += 1
+
+            if stop:
+                # only futures that have not started can be cancelled
+                for future in [f for f in running if f.cancel()]:
+                    running.pop(future)
+
+    table = [results[n] for n in sorted(results)]
+    print("\n***---Stage scan results---***")
+    print("Stages  LCOW ($/m3)  SEC (kWh/m3)  Membrane area (m2)")
+    for row in table:
+        if "LCOW" in row:
+            print(
+                "%6d  %11.4f  %12.2f  %18.1f"
+                % (row["number_of_stages"], row["LCOW"], row["SEC"], row["total_membrane_area"])
+            )
+        else:
+            print("%6d  %s" % (row["number_of_stages"], row["termination"]))
+    return table
+
+
+def _length_domain(ro_stage):
+    # normalized length ContinuousSet a ReverseOsmosis1D stage is discretized on
+    if hasattr(ro_stage, "length_domain"):
+        return ro_stage.length_domain
+    return ro_stage.feed_side.length_domain
+
+
+def transfer_mesh_solution(source, target):
+    """
+    Copy variable values from a solved LSRRO model onto a model with the same
+    configuration but a different number of RO finite elements.
+
+    Variables indexed by a stage's length domain are linearly interpolated
+    along it; all other unfixed variables are copied by name.
+    """
+    transferred = ComponentSet()
+    for idx, target_stage in target.fs.ROUnits.items():
+        source_stage = source.fs.ROUnits[idx]
+        source_x = _length_domain(source_stage)
+        target_x = _length_domain(target_stage)
+        for ctype in (Var, DerivativeVar):
+            _, source_profiles = flatten_dae_components(source_stage, source_x, ctype)
+            _, target_profiles = flatten_dae_components(target_stage, target_x, ctype)
+            source_by_cuid = {
+                str(ComponentUID(ref.referent)): ref for ref in source_profiles
+            }
+            for ref in target_profiles:
+                source_ref = source_by_cuid.get(str(ComponentUID(ref.referent)))
+                if source_ref is None:
+                    continue
+                points = [(x, source_ref[x].value) for x in source_x]
+                points = [(x, val) for x, val in points if val is not None]
+                if not points:
+                    continue
+                xs, ys = zip(*points)
+                for x in target_x:
+                    transferred.add(ref[x])
+                    if not ref[x].fixed:
+                        ref[x].set_value(float(np.interp(x, xs, ys)))
+
+    for var in target.component_data_objects((Var, DerivativeVar)):
+        if var in transferred or var.fixed:
+            continue
+        source_var = source.find_component(var.name)
+        if source_var is not None and source_var.value is not None:
+            var.set_value(source_var.value)
+
+
+def mesh_continuation(
+    initial_elements=5,
+    max_elements=40,
+    refinement_factor=2,
+    lcow_tol=1e-3,
+    **case_kwargs,
+):
+    """
+    Optimize a run_lsrro_case configuration on a coarse RO mesh, then
+    repeatedly refine the mesh by refinement_factor, starting each finer
+    optimization from the interpolated coarser solution instead of running
+    initialize(). Stops when the relative LCOW change between meshes drops
+    below lcow_tol, the mesh would exceed max_elements, or a finer solve
+    fails (the last successful mesh is returned then).
+
+    Returns the finest solved model, its solver results and a list of
+    (number of finite elements, LCOW) pairs.
+    """
+    case = _lsrro_case_arguments(
+        number_of_RO_finite_elements=initial_elements, **case_kwargs
+    )
+    case["store"] = None
+    case["profiler"] = None
+
+    m = _set_up_lsrro_case(case, display=False)
+    res = solve(m, raise_on_failure=False, tee=False, decompose=case["decomposed"])
+    if not check_optimal_termination(res):
+        print(f"\n***---Solve failed on the {initial_elements} element mesh---***")
+        return m, res, []
+
+    elements = initial_elements
+    lcow = value(m.fs.prommis_costing.LCOW)
+    history = [(elements, lcow)]
+    while elements * refinement_factor <= max_elements:
+        elements *= refinement_factor
+        fine_case = dict(case, number_of_RO_finite_elements=elements)
+        fine = build(
+            fine_case["number_of_stages"],
+            fine_case["has_NaCl_solubility_limit"],
+            fine_case["has_calculated_concentration_polarization"],
+            fine_case["has_calculated_ro_pressure_drop"],
+            elements,
+            fine_case["B_max"],
+            use_cache=fine_case["use_build_cache"] or fine_case["build_cache_dir"] is not None,
+            cache_dir=fine_case["build_cache_dir"],
+            lean=fine_case["lean"],
+        )
+        set_operating_conditions(fine, fine_case["Cin"], fine_case["Qin"])
+        _optimize_set_up_case(fine, fine_case)
+        transfer_mesh_solution(m, fine)
+        autoscale(fine)
+        if fine_case["persistent_solver"]:
+            attach_persistent_solver(fine)
+
+        fine_res = solve(
+            fine, raise_on_failure=False, tee=False, decompose=case["decomposed"]
+        )
+        if not check_optimal_termination(fine_res):
+            print(f"\n***---Solve failed on the {elements} element mesh---***")
+            break
+
+        fine_lcow = value(fine.fs.prommis_costing.LCOW)
+        history.append((elements, fine_lcow))
+        m, res = fine, fine_res
+        converged = abs(fine_lcow - lcow) <= lcow_tol * abs(lcow)
+        lcow = fine_lcow
+        if converged:
+            break
+
+    print("\n***---Mesh continuation---***")
+    for elements, lcow in history:
+        print(f"{elements:4d} finite elements: LCOW (PROMMIS) {lcow:.4f} $/m3")
+    return m, res, history
+
+
+# pristine built models, keyed by the build() arguments that shape them
+_build_cache = {}
+
+
 def build(
     number_of_stages=2,
     has_NaCl_solubility_limit=True,
@@ -153,6 +615,96 @@ def build(
     has_calculated_ro_pressure_drop=True,
     number_of_RO_finite_elements=10,
     B_max=None,
+    use_cache=False,
+    cache_dir=None,
+    lean=False,
+):
+    # lean=True leaves out reporting-only components (add_reporting_components
+    # adds them after the solve). use_cache=True clones a per-configuration
+    # template; with cache_dir templates are also pickled there for other
+    # processes, and unreadable or out-of-date files are rebuilt.
+    key = (
+        number_of_stages,
+        bool(has_NaCl_solubility_limit),
+        bool(has_calculated_concentration_polarization),
+        bool(has_calculated_ro_pressure_drop),
+        number_of_RO_finite_elements,
+        B_max,
+        bool(lean),
+    )
+    if not use_cache:
+        m = _build_model(*key)
+        m._lsrro_build_key = key
+        return m
+
+    template = _build_cache.get(key)
+    if template is None and cache_dir is not None:
+        template = _load_template(cache_dir, key)
+        if template is not None:
+            _build_cache[key] = template
+    if template is None:
+        template = _build_model(*key)
+        template._lsrro_build_key = key
+        _build_cache[key] = template
+        if cache_dir is not None:
+            _save_template(cache_dir, key, template)
+    return template.clone()
+
+
+def _template_filename(cache_dir, key):
+    return os.path.join(cache_dir, f"lsrro_template_{config_hash(list(key))}.pkl")
+
+
+def _build_code_version():
+    # templates pickled by another version of the build code are not reused
+    digest = hashlib.sha256()
+    for func in (_build_model, nanofiltration, build_qgess_costing):
+        with open(inspect.getsourcefile(func), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _load_template(cache_dir, key):
+    filename = _template_filename(cache_dir, key)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, "rb") as f:
+            template = pickle.load(f)
+    except Exception as err:
+        print(f"Could not load LSRRO template {filename}, rebuilding: {err}")
+        return None
+    if getattr(template, "_lsrro_code_version", None) != _build_code_version():
+        print(f"LSRRO template {filename} is out of date, rebuilding")
+        return None
+    return template
+
+
+def _save_template(cache_dir, key, template):
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = _template_filename(cache_dir, key)
+    template._lsrro_code_version = _build_code_version()
+    try:
+        payload = pickle.dumps(template)
+    except Exception as err:
+        print(f"Could not pickle LSRRO template, keeping it in memory only: {err}")
+        return
+    # written under a temporary name, so concurrent workers never read a
+    # partial file
+    partial = f"{filename}.{os.getpid()}.tmp"
+    with open(partial, "wb") as f:
+        f.write(payload)
+    os.replace(partial, filename)
+
+
+def _build_model(
+    number_of_stages,
+    has_NaCl_solubility_limit,
+    has_calculated_concentration_polarization,
+    has_calculated_ro_pressure_drop,
+    number_of_RO_finite_elements,
+    B_max,
+    lean=False,
 ):
     # ---building model---
     m = ConcreteModel()
@@ -240,7 +792,7 @@ def build(
         transformation_scheme="BACKWARD",
         transformation_method="dae.finite_difference",
         finite_elements=number_of_RO_finite_elements,
-        has_full_reporting=True,
+        has_full_reporting=not lean,
     )
 
     for idx, ro_stage in m.fs.ROUnits.items():
@@ -328,64 +880,133 @@ def build(
 
     # Append NF
     prommis_list.extend([m.fs.unit2, m.fs.P1])
-    m.fs.prommis_costing.build_process_costs(
-        # arguments related to installation costs
-        piping_materials_and_labor_percentage=20,
-        electrical_materials_and_labor_percentage=20,
-        instrumentation_percentage=8,
-        plants_services_percentage=10,
-        process_buildings_percentage=40,
-        auxiliary_buildings_percentage=15,
-        site_improvements_percentage=10,
-        equipment_installation_percentage=17,
-        field_expenses_percentage=12,
-        project_management_and_construction_percentage=30,
-        process_contingency_percentage=15,
-        # argument related to Fixed OM costs
-        labor_types=[
-            "skilled",
-            "unskilled",
-            "supervisor",
-            "maintenance",
-            "technician",
-            "engineer",
-        ],
-        labor_rate=[24.98, 19.08, 30.39, 22.73, 21.97, 45.85],  # USD/hr
-        labor_burden=25,  # % fringe benefits
-        operators_per_shift=[4, 9, 2, 2, 2, 3],
-        hours_per_shift=8,
-        shifts_per_day=3,
-        operating_days_per_year=336,
-        mixed_product_sale_price_realization_factor=0.65,  # 65% price realization for mixed products
-        # arguments related to total owners costs
-        land_cost=1,
-        resources=[],
-        rates=[],
-        fixed_OM=True,
-        variable_OM=True,
-        feed_input=None,
-        efficiency=0.80,  # power usage efficiency, or fixed motor/distribution efficiency
-        waste=[],
-        recovery_rate_per_year=None,
-        CE_index_year="UKy_2019",
-        watertap_blocks = prommis_list
+    build_qgess_costing(m.fs, prommis_list, land_cost=1, name="prommis_costing")
+
+    product_flow_vol_total = m.fs.product.properties[0].flow_vol
+    denominator = pyunits.convert(product_flow_vol_total, to_units=pyunits.m**3 / pyunits.year)
+    m.fs.prommis_costing.LCOW = Expression(expr=m.fs.prommis_costing.annualized_cost / denominator * 1e6)
+
+    # objective
+    m.fs.objective = Objective(expr=m.fs.prommis_costing.LCOW)
+
+    m.fs.total_membrane_area = Expression(
+        expr=sum(ro.area for ro in m.fs.ROUnits.values())
+    )
 
+    if not lean:
+        _build_reporting_components(m)
+
+    # Connections ------------------------------------------------------------
+    # Connect the feed to the first pump
+    m.fs.feed_to_pump = Arc(
+        source=m.fs.feed.outlet, destination=m.fs.PrimaryPumps[1].inlet
+    )
+
+    # Connect the primary RO permeate to the product
+    m.fs.primary_RO_to_product = Arc(
+        source=m.fs.ROUnits[1].permeate, destination=m.fs.product.inlet
+    )
+
+    # Connect the Pump n to the Mixer n
+    m.fs.pump_to_mixer = Arc(
+        m.fs.NonFinalStages,
+        rule=lambda fs, n: {
+            "source": fs.PrimaryPumps[n].outlet,
+            "destination": fs.Mixers[n].upstream,
+        },
+    )
+
+    # Connect the Mixer n to the Stage n
+    m.fs.mixer_to_stage = Arc(
+        m.fs.NonFinalStages,
+        rule=lambda fs, n: {
+            "source": fs.Mixers[n].outlet,
+            "destination": fs.ROUnits[n].inlet,
+        },
+    )
+
+    # Connect the Stage n to the Eq Pump n
+    m.fs.stage_permeate_to_booster_pump = Arc(
+        m.fs.LSRRO_Stages,
+        rule=lambda fs, n: {
+            "source": fs.ROUnits[n].permeate,
+            "destination": fs.BoosterPumps[n].inlet,
+        },
+    )
+
+    # Connect the Eq Pump n to the Mixer n-1
+    m.fs.booster_pump_to_mixer = Arc(
+        m.fs.LSRRO_Stages,
+        rule=lambda fs, n: {
+            "source": fs.BoosterPumps[n].outlet,
+            "destination": fs.Mixers[n - 1].downstream,
+        },
     )
 
-    QGESSCostingData.costing_initialization(m.fs.prommis_costing)
-    QGESSCostingData.initialize_fixed_OM_costs(m.fs.prommis_costing)
+    last_stage = m.fs.LastStage
+    if number_of_stages > 1:
+        # Connect the primary RO permeate to the product
+        m.fs.primary_RO_to_erd = Arc(
+            source=m.fs.ROUnits[1].retentate,
+            destination=m.fs.EnergyRecoveryDevices[1].inlet,
+        )
+        # Connect 1st stage ERD to primary pump
+        m.fs.primary_ERD_to_pump = Arc(
+            source=m.fs.EnergyRecoveryDevices[1].outlet,
+            destination=m.fs.PrimaryPumps[2].inlet,
+        )
+
+    # Connect the Stage n to the Pump n+1
+    m.fs.stage_retentate_to_pump = Arc(
+        m.fs.IntermediateStages,
+        rule=lambda fs, n: {
+            "source": fs.ROUnits[n].retentate,
+            "destination": fs.PrimaryPumps[n + 1].inlet,
+        },
+    )
+    # Connect the Pump N to the Stage N
+    m.fs.pumpN_to_stageN = Arc(
+        source=m.fs.PrimaryPumps[last_stage].outlet,
+        destination=m.fs.ROUnits[last_stage].inlet,
+    )
+    # Connect Final Stage to EnergyRecoveryDevice Pump
+    m.fs.stage_to_erd = Arc(
+        source=m.fs.ROUnits[last_stage].retentate,
+        destination=m.fs.EnergyRecoveryDevices[last_stage].inlet,
+    )
+    # Connect the EnergyRecoveryDevice to the disposal
+    m.fs.erd_to_disposal = Arc(
+        source=m.fs.EnergyRecoveryDevices[last_stage].outlet,
+        destination=m.fs.disposal.inlet,
+    )
+
+    #additional bounding
+    if has_NaCl_solubility_limit:
+        for b in m.component_data_objects(Block, descend_into=True):
+            # NaCl solubility limit
+            if hasattr(b, "is_property_constructed") and b.is_property_constructed(
+                "mass_frac_phase_comp"
+            ):
+                try:
+                    b.mass_frac_phase_comp["Liq", "TDS"].setub(0.2614)
+                except:
+                    pass
+
+    TransformationFactory("network.expand_arcs").apply_to(m)
+
+    return m
+
+
+def _build_reporting_components(m):
+    # WaterTAP LCOW/SEC, LCOW breakdown and sweep quantities; none of them
+    # enter the objective, so lean models only build them after the solve
+    number_of_stages = value(m.fs.NumberOfStages)
 
     product_flow_vol_total = m.fs.product.properties[0].flow_vol
     m.fs.costing.add_annual_water_production(product_flow_vol_total)
     m.fs.costing.add_specific_energy_consumption(product_flow_vol_total)
     m.fs.costing.add_LCOW(product_flow_vol_total)
 
-    denominator = pyunits.convert(product_flow_vol_total, to_units=pyunits.m**3 / pyunits.year)
-    m.fs.prommis_costing.LCOW = Expression(expr=m.fs.prommis_costing.annualized_cost / denominator * 1e6)
-
-    # objective
-    m.fs.objective = Objective(expr=m.fs.prommis_costing.LCOW)
-
     # Expressions for parameter sweep -----------------------------------------
     # Final permeate concentration as mass fraction
     m.fs.product.properties[0].mass_frac_phase_comp
@@ -448,10 +1069,6 @@ def build(
         / m.fs.costing.annual_water_production
     )
 
-    m.fs.total_membrane_area = Expression(
-        expr=sum(ro.area for ro in m.fs.ROUnits.values())
-    )
-
     m.fs.costing.booster_pump_capex_lcow = Expression(
         expr=m.fs.costing.capital_recovery_factor
         * (
@@ -536,105 +1153,47 @@ def build(
         + m.fs.costing.membrane_replacement_lcow
     )
 
-    # Connections ------------------------------------------------------------
-    # Connect the feed to the first pump
-    m.fs.feed_to_pump = Arc(
-        source=m.fs.feed.outlet, destination=m.fs.PrimaryPumps[1].inlet
-    )
-
-    # Connect the primary RO permeate to the product
-    m.fs.primary_RO_to_product = Arc(
-        source=m.fs.ROUnits[1].permeate, destination=m.fs.product.inlet
-    )
 
-    # Connect the Pump n to the Mixer n
-    m.fs.pump_to_mixer = Arc(
-        m.fs.NonFinalStages,
-        rule=lambda fs, n: {
-            "source": fs.PrimaryPumps[n].outlet,
-            "destination": fs.Mixers[n].upstream,
-        },
-    )
-
-    # Connect the Mixer n to the Stage n
-    m.fs.mixer_to_stage = Arc(
-        m.fs.NonFinalStages,
-        rule=lambda fs, n: {
-            "source": fs.Mixers[n].outlet,
-            "destination": fs.ROUnits[n].inlet,
-        },
-    )
+def add_reporting_components(m):
+    """
+    Add the reporting components left out of a model built with lean=True
+    and compute the variables they introduce from the solved state. Does
+    nothing for models that already have them.
+
+    New variables are calculated one at a time from new equality
+    constraints in which they are the only uncomputed new variable, until no
+    more can be calculated. The RO full-reporting variables are a
+    construction option of ReverseOsmosis1D and stay unavailable.
+    """
+    if m.fs.component("mass_water_recovery") is not None:
+        return
+    old_vars = ComponentSet(m.component_data_objects(Var, descend_into=True))
+    old_cons = ComponentSet(m.component_data_objects(Constraint, descend_into=True))
 
-    # Connect the Stage n to the Eq Pump n
-    m.fs.stage_permeate_to_booster_pump = Arc(
-        m.fs.LSRRO_Stages,
-        rule=lambda fs, n: {
-            "source": fs.ROUnits[n].permeate,
-            "destination": fs.BoosterPumps[n].inlet,
-        },
-    )
+    _build_reporting_components(m)
 
-    # Connect the Eq Pump n to the Mixer n-1
-    m.fs.booster_pump_to_mixer = Arc(
-        m.fs.LSRRO_Stages,
-        rule=lambda fs, n: {
-            "source": fs.BoosterPumps[n].outlet,
-            "destination": fs.Mixers[n - 1].downstream,
-        },
+    new_vars = ComponentSet(
+        v for v in m.component_data_objects(Var, descend_into=True) if v not in old_vars
     )
-
-    last_stage = m.fs.LastStage
-    if number_of_stages > 1:
-        # Connect the primary RO permeate to the product
-        m.fs.primary_RO_to_erd = Arc(
-            source=m.fs.ROUnits[1].retentate,
-            destination=m.fs.EnergyRecoveryDevices[1].inlet,
-        )
-        # Connect 1st stage ERD to primary pump
-        m.fs.primary_ERD_to_pump = Arc(
-            source=m.fs.EnergyRecoveryDevices[1].outlet,
-            destination=m.fs.PrimaryPumps[2].inlet,
-        )
-
-    # Connect the Stage n to the Pump n+1
-    m.fs.stage_retentate_to_pump = Arc(
-        m.fs.IntermediateStages,
-        rule=lambda fs, n: {
-            "source": fs.ROUnits[n].retentate,
-            "destination": fs.PrimaryPumps[n + 1].inlet,
-        },
-    )
-    # Connect the Pump N to the Stage N
-    m.fs.pumpN_to_stageN = Arc(
-        source=m.fs.PrimaryPumps[last_stage].outlet,
-        destination=m.fs.ROUnits[last_stage].inlet,
-    )
-    # Connect Final Stage to EnergyRecoveryDevice Pump
-    m.fs.stage_to_erd = Arc(
-        source=m.fs.ROUnits[last_stage].retentate,
-        destination=m.fs.EnergyRecoveryDevices[last_stage].inlet,
-    )
-    # Connect the EnergyRecoveryDevice to the disposal
-    m.fs.erd_to_disposal = Arc(
-        source=m.fs.EnergyRecoveryDevices[last_stage].outlet,
-        destination=m.fs.disposal.inlet,
-    )
-
-    #additional bounding
-    if has_NaCl_solubility_limit:
-        for b in m.component_data_objects(Block, descend_into=True):
-            # NaCl solubility limit
-            if hasattr(b, "is_property_constructed") and b.is_property_constructed(
-                "mass_frac_phase_comp"
-            ):
-                try:
-                    b.mass_frac_phase_comp["Liq", "TDS"].setub(0.2614)
-                except:
-                    pass
-
-    TransformationFactory("network.expand_arcs").apply_to(m)
-
-    return m
+    pending = [
+        c
+        for c in m.component_data_objects(Constraint, active=True, descend_into=True)
+        if c not in old_cons and c.equality
+    ]
+    while pending:
+        remaining = []
+        for con in pending:
+            unknown = [
+                v for v in identify_variables(con.body) if v in new_vars and not v.fixed
+            ]
+            if len(unknown) == 1:
+                calculate_variable_from_constraint(unknown[0], con)
+                new_vars.remove(unknown[0])
+            elif unknown:
+                remaining.append(con)
+        if len(remaining) == len(pending):
+            break
+        pending = remaining
 
 
 def build_high_pressure_pump_cost_param_block(blk):
@@ -691,6 +1250,8 @@ def set_operating_conditions(m, Cin=None, Qin=None):
     # feed_flow_mass = 1*pyunits.kg/pyunits.s
     if Cin is None:
         Cin = 70
+    # feed specification, used to key cached initialization states
+    m._lsrro_feed = (float(Cin), float(Qin))
 
     feed_temperature = 273.15 + 20
 
@@ -752,10 +1313,8 @@ def set_operating_conditions(m, Cin=None, Qin=None):
     ].pressure.fix(pressure_atm)
 
     # ---scaling---
-    #m.fs.properties.set_default_scaling("flow_mass_phase_comp", 1, index=("Liq", "H2O")) #default WaterTAP scaling
-    m.fs.properties.set_default_scaling("flow_mass_phase_comp", 1e-2, index=("Liq", "H2O")) #adjusted scaling
-    #m.fs.properties.set_default_scaling("flow_mass_phase_comp", 1e2, index=("Liq", "TDS")) #default WaterTAP scaling
-    m.fs.properties.set_default_scaling("flow_mass_phase_comp", 1e-1, index=("Liq", "TDS")) #adjusted scaling
+    # inverse of the order of magnitude of each feed flow
+    set_flow_scaling(m.fs.properties, feed_flows(m.fs.feed.properties[0]))
     iscale.calculate_scaling_factors(m)
 
     # ---checking model---
@@ -774,16 +1333,16 @@ def _lsrro_mixer_guess_initializer(
 
     for vname in mixer.upstream.vars:
         if vname == "flow_mass_phase_comp":
-            for time, phase, comp in mixer.upstream.vars[vname]:
+            for time, p, comp in mixer.upstream.vars[vname]:
                 if comp in mixer.config.property_package.solute_set:
-                    mixer.downstream.vars[vname][time, phase, comp].value = (
+                    mixer.downstream.vars[vname][time, p, comp].value = (
                         solute_multiplier
-                        * mixer.upstream.vars[vname][time, phase, comp].value
+                        * mixer.upstream.vars[vname][time, p, comp].value
                     )
                 elif comp in mixer.config.property_package.solvent_set:
-                    mixer.downstream.vars[vname][time, phase, comp].value = (
+                    mixer.downstream.vars[vname][time, p, comp].value = (
                         solvent_multiplier
-                        * mixer.upstream.vars[vname][time, phase, comp].value
+                        * mixer.upstream.vars[vname][time, p, comp].value
                     )
                 else:
                     raise RuntimeError(f"Unknown component {comp}")
@@ -796,10 +1355,18 @@ def _lsrro_mixer_guess_initializer(
     mixer.initialize(optarg=optarg)
 
 
-def do_forward_initialization_pass(m, optarg, guess_mixers):
+def _initialize_unit(unit, profiler=None, **kwargs):
+    # unit.initialize(**kwargs), timed as "<unit name>.initialize"
+    with phase(profiler, f"{unit.name}.initialize"):
+        unit.initialize(**kwargs)
+
+
+def do_forward_initialization_pass(
+    m, optarg, guess_mixers, guess=None, profiler=None
+):
     print("--------------------START FORWARD INITIALIZATION PASS--------------------")
     # start with the feed
-    m.fs.feed.initialize(optarg=optarg)
+    _initialize_unit(m.fs.feed, profiler, optarg=optarg)
 
     propagate_state(m.fs.feed_to_pump)
 
@@ -807,38 +1374,43 @@ def do_forward_initialization_pass(m, optarg, guess_mixers):
     first_stage = m.fs.FirstStage
 
     for stage in m.fs.Stages:
-        m.fs.PrimaryPumps[stage].initialize(optarg=optarg)
+        _initialize_unit(m.fs.PrimaryPumps[stage], profiler, optarg=optarg)
 
         if stage == last_stage:
             propagate_state(m.fs.pumpN_to_stageN)
         else:
             propagate_state(m.fs.pump_to_mixer[stage])
             if guess_mixers:
-                _lsrro_mixer_guess_initializer(
-                    m.fs.Mixers[stage],
-                    solvent_multiplier=0.5,
-                    solute_multiplier=0.2,
-                    optarg=optarg,
-                )
+                # predicted multipliers if available, else the default guess
+                stage_guess = (guess or {}).get(stage, {})
+                with phase(profiler, f"{m.fs.Mixers[stage].name}.initialize"):
+                    _lsrro_mixer_guess_initializer(
+                        m.fs.Mixers[stage],
+                        solvent_multiplier=stage_guess.get("solvent_multiplier", 0.5),
+                        solute_multiplier=stage_guess.get("solute_multiplier", 0.2),
+                        optarg=optarg,
+                    )
             else:
-                m.fs.Mixers[stage].initialize(optarg=optarg)
+                _initialize_unit(m.fs.Mixers[stage], profiler, optarg=optarg)
             propagate_state(m.fs.mixer_to_stage[stage])
 
         try:
-            m.fs.ROUnits[stage].initialize(optarg=optarg)
+            _initialize_unit(m.fs.ROUnits[stage], profiler, optarg=optarg)
         except InitializationError:
             pass
 
         if stage == first_stage:
             propagate_state(m.fs.primary_RO_to_product)
-            m.fs.product.initialize(optarg=optarg)
+            _initialize_unit(m.fs.product, profiler, optarg=optarg)
             if value(m.fs.NumberOfStages) > 1:
                 propagate_state(m.fs.primary_RO_to_erd)
-                m.fs.EnergyRecoveryDevices[first_stage].initialize(optarg=optarg)
+                _initialize_unit(
+                    m.fs.EnergyRecoveryDevices[first_stage], profiler, optarg=optarg
+                )
                 propagate_state(m.fs.primary_ERD_to_pump)
         else:
             propagate_state(m.fs.stage_permeate_to_booster_pump[stage])
-            m.fs.BoosterPumps[stage].initialize(optarg=optarg)
+            _initialize_unit(m.fs.BoosterPumps[stage], profiler, optarg=optarg)
             propagate_state(m.fs.booster_pump_to_mixer[stage])
 
         if stage in m.fs.IntermediateStages:
@@ -846,37 +1418,128 @@ def do_forward_initialization_pass(m, optarg, guess_mixers):
 
     # for the end stage
     propagate_state(m.fs.stage_to_erd)
-    m.fs.EnergyRecoveryDevices[last_stage].initialize(optarg=optarg)
+    _initialize_unit(
+        m.fs.EnergyRecoveryDevices[last_stage], profiler, optarg=optarg
+    )
     propagate_state(m.fs.erd_to_disposal)
-    m.fs.disposal.initialize(optarg=optarg)
+    _initialize_unit(m.fs.disposal, profiler, optarg=optarg)
 
 
-def do_backward_initialization_pass(m, optarg):
+def do_backward_initialization_pass(m, optarg, profiler=None):
     print("--------------------START BACKWARD INITIALIZATION PASS--------------------")
 
     first_stage = m.fs.FirstStage
     for stage in reversed(m.fs.NonFinalStages):
-        m.fs.Mixers[stage].initialize(optarg=optarg)
+        _initialize_unit(m.fs.Mixers[stage], profiler, optarg=optarg)
         propagate_state(m.fs.mixer_to_stage[stage])
         try:
-            m.fs.ROUnits[stage].initialize(optarg=optarg)
+            _initialize_unit(m.fs.ROUnits[stage], profiler, optarg=optarg)
         except InitializationError:
             pass
         if stage == first_stage:
             if value(m.fs.NumberOfStages) > 1:
                 propagate_state(m.fs.primary_ERD_to_pump)
-                m.fs.EnergyRecoveryDevices[first_stage].initialize(optarg=optarg)
+                _initialize_unit(
+                    m.fs.EnergyRecoveryDevices[first_stage], profiler, optarg=optarg
+                )
                 propagate_state(m.fs.primary_RO_to_erd)
             propagate_state(m.fs.primary_RO_to_product)
-            m.fs.product.initialize(optarg=optarg)
+            _initialize_unit(m.fs.product, profiler, optarg=optarg)
         else:
             propagate_state(m.fs.stage_retentate_to_pump[stage])
             propagate_state(m.fs.stage_permeate_to_booster_pump[stage])
-            m.fs.BoosterPumps[stage].initialize(optarg=optarg)
+            _initialize_unit(m.fs.BoosterPumps[stage], profiler, optarg=optarg)
             propagate_state(m.fs.booster_pump_to_mixer[stage])
 
 
-def initialize(m, verbose=True, solver=None):
+def _initialization_cache_config(m):
+    return config_hash({"build": list(m._lsrro_build_key)})
+
+
+def _save_initialization(m, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    Cin, Qin = m._lsrro_feed
+    config = _initialization_cache_config(m)
+    filename = f"init_{config_hash([config, Cin, Qin])}.json.gz"
+    # written under a temporary name and renamed, so workers sharing the cache
+    # never read a partial file; indexed only once it is in place
+    path = os.path.join(cache_dir, filename)
+    partial = f"{path}.{os.getpid()}.tmp"
+    to_json(m, fname=partial, wts=StoreSpec.value(), gz=True)
+    os.replace(partial, path)
+    # "full" marks states from the complete initialization procedure; only
+    # those are restored
+    SweepStore(os.path.join(cache_dir, "index.jsonl")).append(
+        config,
+        f"Cin={Cin!r},Qin={Qin!r}",
+        {"Cin": Cin, "Qin": Qin, "file": filename, "full": True},
+    )
+
+
+def _load_initialization(m, cache_dir):
+    """
+    Load the cached initialization state closest to the model's feed.
+
+    Returns "exact" when the state was saved for the same build flags and feed,
+    "nearest" when it comes from another feed (the fixed feed and design values
+    of the model are kept), and None when nothing is cached for the build.
+    """
+    Cin, Qin = m._lsrro_feed
+    entries = SweepStore(os.path.join(cache_dir, "index.jsonl")).completed(
+        _initialization_cache_config(m)
+    )
+    entries = [
+        entry
+        for entry in entries.values()
+        if entry["full"] and os.path.exists(os.path.join(cache_dir, entry["file"]))
+    ]
+    if not entries:
+        return None
+
+    # distance in log space, so Cin and Qin count relative to their size
+    entry = min(
+        entries,
+        key=lambda e: np.log(e["Cin"] / Cin) ** 2 + np.log(e["Qin"] / Qin) ** 2,
+    )
+    exact = entry["Cin"] == Cin and entry["Qin"] == Qin
+
+    fixed_values = ComponentMap(
+        (v, v.value) for v in m.component_data_objects(Var) if v.fixed
+    )
+    from_json(m, fname=os.path.join(cache_dir, entry["file"]), wts=StoreSpec.value(), gz=True)
+    if not exact:
+        for v, val in fixed_values.items():
+            v.set_value(val)
+    return "exact" if exact else "nearest"
+
+
+def initialize(
+    m,
+    verbose=True,
+    solver=None,
+    cache_dir=None,
+    predictor=None,
+    water_recovery=None,
+    profiler=None,
+):
+    """
+    Initialize the LSRRO flowsheet with forward/backward passes and a
+    SequentialDecomposition run.
+
+    If cache_dir is given, the converged state is saved there keyed by the
+    build flags and the (Cin, Qin) feed. A later call for the same key loads it
+    and skips all passes; a call for a different feed starts from the nearest
+    cached state and only runs a single forward pass. Only states from the
+    full procedure are saved, so a nearest-start state is never restored as
+    an exact hit.
+
+    predictor is an optional RecycleGuessPredictor. When it has data for the
+    number of stages, its recycle multipliers replace the fixed mixer guess
+    and the backward/forward passes are skipped, leaving the tear streams to
+    the SequentialDecomposition run.
+
+    If a PhaseProfiler is given, every pass and unit initialization is timed.
+    """
 
     # ---initializing---
     # set up solvers
@@ -884,10 +1547,42 @@ def initialize(m, verbose=True, solver=None):
         solver = get_solver()
 
     optarg = solver.options
-    do_forward_initialization_pass(m, optarg=optarg, guess_mixers=True)
-    for _ in range(m.fs.NumberOfStages.value // 2):
-        do_backward_initialization_pass(m, optarg=optarg)
-        do_forward_initialization_pass(m, optarg=optarg, guess_mixers=False)
+
+    if cache_dir is not None:
+        with phase(profiler, "load_cached_state"):
+            cached = _load_initialization(m, cache_dir)
+        if cached == "exact":
+            print("Loaded cached initialization state")
+            return
+        if cached == "nearest":
+            print("Starting from nearest cached initialization state")
+            with phase(profiler, "forward_pass"):
+                do_forward_initialization_pass(
+                    m, optarg=optarg, guess_mixers=False, profiler=profiler
+                )
+            with phase(profiler, "costing"):
+                m.fs.costing.initialize()
+            return
+
+    guess = predictor.predict(m, water_recovery) if predictor is not None else None
+    if guess is not None and predictor.apply_pressures:
+        for stage, stage_guess in guess.items():
+            m.fs.PrimaryPumps[stage].control_volume.properties_out[0].pressure.fix(
+                stage_guess["pressure"]
+            )
+
+    with phase(profiler, "forward_pass"):
+        do_forward_initialization_pass(
+            m, optarg=optarg, guess_mixers=True, guess=guess, profiler=profiler
+        )
+    number_of_passes = 0 if guess is not None else m.fs.NumberOfStages.value // 2
+    for _ in range(number_of_passes):
+        with phase(profiler, "backward_pass"):
+            do_backward_initialization_pass(m, optarg=optarg, profiler=profiler)
+        with phase(profiler, "forward_pass"):
+            do_forward_initialization_pass(
+                m, optarg=optarg, guess_mixers=False, profiler=profiler
+            )
 
     # # set up SD tool
     seq = SequentialDecomposition()
@@ -900,21 +1595,39 @@ def initialize(m, verbose=True, solver=None):
     def func_initialize(unit):
         outlvl = idaeslogger.INFO if verbose else idaeslogger.CRITICAL
         try:
-            unit.initialize(optarg=solver.options, outlvl=outlvl)
+            _initialize_unit(unit, profiler, optarg=solver.options, outlvl=outlvl)
         except InitializationError:
             pass
 
-    seq.run(m, func_initialize)
+    with phase(profiler, "sequential_decomposition"):
+        seq.run(m, func_initialize)
+
+    with phase(profiler, "costing"):
+        m.fs.costing.initialize()
 
-    m.fs.costing.initialize()
+    if cache_dir is not None:
+        _save_initialization(m, cache_dir)
 
 
-def solve(model, solver=None, tee=False, raise_on_failure=False):
+def solve(
+    model,
+    solver=None,
+    tee=False,
+    raise_on_failure=False,
+    label="optimization",
+    decompose=False,
+):
     # ---solving---
+    if solver is None:
+        solver = attached_solver(model)
     if solver is None:
         solver = get_solver()
 
-    results = solver.solve(model, tee=tee)
+    # IPOPT statistics of every solve are kept on model._solver_stats
+    if decompose:
+        results = solve_decomposed(model, solver, tee=tee, label=label)
+    else:
+        results = record_solve(model, solver, tee=tee, label=label)
     if check_optimal_termination(results):
         return results
     msg = (
@@ -927,6 +1640,108 @@ def solve(model, solver=None, tee=False, raise_on_failure=False):
         return results
 
 
+def independent_subsystems(m):
+    """
+    Split the active non-costing constraints of a model into groups that
+    share no unfixed variables, e.g. the NF train and the RO train of the
+    LSRRO flowsheet, which are only coupled through the QGESS costing.
+
+    Returns a list of (constraints, ComponentSet of variables) pairs,
+    largest first.
+    """
+    parent = ComponentMap()
+
+    def find(v):
+        root = v
+        while parent[root] is not root:
+            root = parent[root]
+        while parent[v] is not root:
+            parent[v], v = root, parent[v]
+        return root
+
+    constraint_vars = []
+    for con in m.component_data_objects(Constraint, active=True, descend_into=True):
+        if in_costing_block(con):
+            continue
+        variables = list(identify_variables(con.body, include_fixed=False))
+        if not variables:
+            continue
+        for v in variables:
+            if v not in parent:
+                parent[v] = v
+        root = find(variables[0])
+        for v in variables[1:]:
+            other = find(v)
+            if other is not root:
+                parent[other] = root
+        constraint_vars.append((con, variables))
+
+    groups = {}
+    for con, variables in constraint_vars:
+        constraints, group_vars = groups.setdefault(
+            id(find(variables[0])), ([], ComponentSet())
+        )
+        constraints.append(con)
+        group_vars.update(variables)
+    return sorted(groups.values(), key=lambda g: len(g[1]), reverse=True)
+
+
+def solve_decomposed(model, solver=None, tee=False, label="optimization"):
+    """
+    Solve the independent square subsystems of a model (see
+    independent_subsystems) on their own, fix their variables, solve the
+    remaining problem with the costing that couples them, and unfix them
+    again. The largest subsystem is always left to the final solve.
+
+    If a subsystem solve fails the model is solved in one piece instead.
+    """
+    if solver is None:
+        solver = get_solver()
+    # a separate solver for the subsystems, so a persistent main solver keeps
+    # its instance
+    subsystem_solver = get_solver()
+    if not hasattr(model, "_solver_stats"):
+        model._solver_stats = []
+
+    presolved = []
+    for constraints, variables in independent_subsystems(model)[1:]:
+        if len(variables) != len(constraints) or not all(c.equality for c in constraints):
+            continue
+        subsystem = ComponentSet(constraints)
+        to_deactivate = [
+            c
+            for c in model.component_data_objects(Constraint, active=True, descend_into=True)
+            if c not in subsystem
+        ]
+        to_deactivate.extend(model.component_data_objects(Objective, active=True))
+        to_fix = [
+            v
+            for v in model.component_data_objects(Var, descend_into=True)
+            if not v.fixed and v not in variables
+        ]
+        with TemporarySubsystemManager(to_fix=to_fix, to_deactivate=to_deactivate):
+            results, stats = solve_with_stats(
+                subsystem_solver, model, tee=tee, label=f"{label}/subsystem"
+            )
+        model._solver_stats.append(stats)
+        if not check_optimal_termination(results):
+            print(
+                f"Independent subsystem of {len(variables)} variables failed "
+                f"({results.solver.termination_condition}), solving the full model"
+            )
+            for v in presolved:
+                v.unfix()
+            return record_solve(model, solver, tee=tee, label=label)
+        for v in variables:
+            v.fix()
+            presolved.append(v)
+
+    try:
+        return record_solve(model, solver, tee=tee, label=label)
+    finally:
+        for v in presolved:
+            v.unfix()
+
 
 def optimize_set_up(
     m,
@@ -1212,124 +2027,125 @@ def display_design(m):
         )
 
 
-def display_state(m):
+def display_state(m, data=None):
     print("--------state---------")
+    if data is None:
+        data = get_state_data(m)
 
-    def print_state(s, b):
-        flow_mass = sum(
-            b.flow_mass_phase_comp[0, "Liq", j].value for j in ["H2O", "TDS"]
-        )
-        mass_frac_ppm = b.flow_mass_phase_comp[0, "Liq", "TDS"].value / flow_mass * 1e6
-        pressure_bar = b.pressure[0].value / 1e5
+    def print_state(s, stream):
         print(
             s.ljust(20)
             + ": %.3f kg/s, %.0f ppm, %.1f bar"
-            % (flow_mass, mass_frac_ppm, pressure_bar)
+            % (stream["flow_mass"], stream["mass_frac_ppm"], stream["pressure_bar"])
         )
 
-    print_state("Feed", m.fs.feed.outlet)
+    print_state("Feed", data["Feed"])
     for stage in m.fs.Stages:
+        stage_data = data[str(stage)]
 
-        print_state(f"Primary Pump {stage} out", m.fs.PrimaryPumps[stage].outlet)
+        print_state(f"Primary Pump {stage} out", stage_data["PrimaryPump"]["out"])
         if stage == m.fs.LastStage:
             pass
         else:
-            print_state(f"Mixer {stage} recycle", m.fs.Mixers[stage].downstream)
-            print_state(f"Mixer {stage} out", m.fs.Mixers[stage].outlet)
+            print_state(f"Mixer {stage} recycle", stage_data["Mixer"]["recycle"])
+            print_state(f"Mixer {stage} out", stage_data["Mixer"]["out"])
 
-        print_state(f"RO {stage} permeate", m.fs.ROUnits[stage].permeate)
-        print_state(f"RO {stage} retentate", m.fs.ROUnits[stage].retentate)
-        wr = m.fs.ROUnits[stage].recovery_vol_phase[0, "Liq"].value
+        print_state(f"RO {stage} permeate", stage_data["RO"]["permeate"])
+        print_state(f"RO {stage} retentate", stage_data["RO"]["retentate"])
 
         if stage == m.fs.FirstStage:
             pass
         else:
-            print_state(f"Booster Pump {stage} out", m.fs.BoosterPumps[stage].outlet)
+            print_state(f"Booster Pump {stage} out", stage_data["BoosterPump"]["out"])
+
+    print_state(f"Disposal", data["Disposal"])
+    print_state(f"Product", data["Product"])
 
-    print_state(f"Disposal", m.fs.disposal.inlet)
-    print_state(f"Product", m.fs.product.inlet)
+def _stream_data(state, port):
+    # flow, concentration and pressure of a port, looked up in a StateColumns
+    flow = [state[port.flow_mass_phase_comp[0, "Liq", j]] for j in ["H2O", "TDS"]]
+    flow_mass = sum(flow)
+    return {
+        "flow_mass": float(flow_mass),
+        "mass_frac_ppm": float(flow[1] / flow_mass * 1e6),
+        "pressure_bar": float(state[port.pressure[0]] / 1e5),
+    }
 
-def get_state_data(m):
+
+def get_state_data(m, state=None):
+    """
+    Summary of a solved model: stream conditions around every unit, SEC,
+    LCOW and recovery. The values are read from a StateColumns snapshot,
+    taken here if one is not passed in.
+    """
+    if state is None:
+        state = StateColumns.from_model(m)
     data = {}
-    
-    def get_stream_data(b):
-        flow_mass = sum(
-            b.flow_mass_phase_comp[0, "Liq", j].value for j in ["H2O", "TDS"]
-        )
-        mass_frac_ppm = b.flow_mass_phase_comp[0, "Liq", "TDS"].value / flow_mass * 1e6
-        pressure_bar = b.pressure[0].value / 1e5
-        return {
-            "flow_mass": float(flow_mass),
-            "mass_frac_ppm": float(mass_frac_ppm),
-            "pressure_bar": float(pressure_bar)
-        }
 
-    data["Feed"] = get_stream_data(m.fs.feed.outlet)
-    
+    data["Feed"] = _stream_data(state, m.fs.feed.outlet)
+
     for stage in m.fs.Stages:
         data[str(stage)] = {
             "PrimaryPump": {
-                "out": get_stream_data(m.fs.PrimaryPumps[stage].outlet)
+                "out": _stream_data(state, m.fs.PrimaryPumps[stage].outlet)
             },
             "RO": {
-                "permeate": get_stream_data(m.fs.ROUnits[stage].permeate),
-                "retentate": get_stream_data(m.fs.ROUnits[stage].retentate),
-                "recovery": float(m.fs.ROUnits[stage].recovery_vol_phase[0, "Liq"].value)
+                "permeate": _stream_data(state, m.fs.ROUnits[stage].permeate),
+                "retentate": _stream_data(state, m.fs.ROUnits[stage].retentate),
+                "recovery": float(state[m.fs.ROUnits[stage].recovery_vol_phase[0, "Liq"]])
             }
         }
-        
+
         if stage != m.fs.LastStage:
             data[str(stage)]["Mixer"] = {
-                "recycle": get_stream_data(m.fs.Mixers[stage].downstream),
-                "out": get_stream_data(m.fs.Mixers[stage].outlet)
+                "recycle": _stream_data(state, m.fs.Mixers[stage].downstream),
+                "out": _stream_data(state, m.fs.Mixers[stage].outlet)
             }
 
         if stage != m.fs.FirstStage:
             data[str(stage)]["BoosterPump"] = {
-                "out": get_stream_data(m.fs.BoosterPumps[stage].outlet)
+                "out": _stream_data(state, m.fs.BoosterPumps[stage].outlet)
             }
 
-    data["Disposal"] = get_stream_data(m.fs.disposal.inlet)
-    data["Product"] = get_stream_data(m.fs.product.inlet)
+    data["Disposal"] = _stream_data(state, m.fs.disposal.inlet)
+    data["Product"] = _stream_data(state, m.fs.product.inlet)
     data["SEC"] = value(m.fs.costing.specific_energy_consumption)
     data["LCOW"] = value(m.fs.prommis_costing.LCOW)
     data["WaterTAP LCOW"] = value(m.fs.costing.LCOW)
-    data["Recovery"] = value(m.fs.water_recovery)
+    data["Recovery"] = float(state[m.fs.water_recovery])
+    data["Solver Stats"] = list(getattr(m, "_solver_stats", []))
 
     return data
-def save_state(m, filename="state.json"):
+def save_state(m, filename="state.json", state=None, data=None):
+    """
+    Save the get_state_data() summary. A filename ending in .npz gets a
+    compressed binary file holding every variable of the model as well, which
+    state_columns.load_state_data() reads back.
+    """
+    if state is None:
+        state = StateColumns.from_model(m)
+    if data is None:
+        data = get_state_data(m, state)
+    if filename.endswith(".npz"):
+        state.save(filename, summary=data)
+        return
     import json
-    data = get_state_data(m)
     with open(filename, 'w') as f:
         json.dump(data, f, indent=4)
 
 
-def display_system(m):
+def display_system(m, data=None):
     print("----system metrics----")
-    feed_flow_mass = sum(
-        m.fs.feed.flow_mass_phase_comp[0, "Liq", j].value for j in ["H2O", "TDS"]
-    )
-    feed_mass_frac_TDS = (
-        m.fs.feed.flow_mass_phase_comp[0, "Liq", "TDS"].value / feed_flow_mass
-    )
-    print("Feed: %.2f kg/s, %.0f ppm" % (feed_flow_mass, feed_mass_frac_TDS * 1e6))
+    if data is None:
+        data = get_state_data(m)
+    feed = data["Feed"]
+    print("Feed: %.2f kg/s, %.0f ppm" % (feed["flow_mass"], feed["mass_frac_ppm"]))
 
+    product = data["Product"]
+    print("Product: %.3f kg/s, %.0f ppm" % (product["flow_mass"], product["mass_frac_ppm"]))
 
-    prod_flow_mass = sum(
-        m.fs.product.flow_mass_phase_comp[0, "Liq", j].value for j in ["H2O", "TDS"]
-    )
-    prod_mass_frac_TDS = (
-        m.fs.product.flow_mass_phase_comp[0, "Liq", "TDS"].value / prod_flow_mass
-    )
-    print("Product: %.3f kg/s, %.0f ppm" % (prod_flow_mass, prod_mass_frac_TDS * 1e6))
-
-    brine_flow_mass = sum(
-        m.fs.disposal.flow_mass_phase_comp[0, "Liq", j].value for j in ["H2O", "TDS"]
-    )
-    brine_mass_frac_TDS = (
-        m.fs.disposal.flow_mass_phase_comp[0, "Liq", "TDS"].value / brine_flow_mass
-    )
-    print("Brine: %.3f kg/s, %.0f ppm" % (brine_flow_mass, brine_mass_frac_TDS * 1e6))
+    brine = data["Disposal"]
+    print("Brine: %.3f kg/s, %.0f ppm" % (brine["flow_mass"], brine["mass_frac_ppm"]))
 
     print("Volumetric water recovery: %.1f%%" % (value(m.fs.water_recovery) * 100))
     print(f"Number of Stages: {value(m.fs.NumberOfStages)}")
@@ -0,0 +1,108 @@
+# Recycle multiplier and pump pressure guesses for LSRRO, interpolated from
+# converged get_state_data() outputs with the same number of stages.
+
+import glob
+
+import numpy as np
+
+from pyomo.environ import value
+
+from state_columns import load_state_data
+
+
+def _stage_keys(data):
+    return sorted((k for k in data if k.isdigit()), key=int)
+
+
+def _solvent_solute(stream):
+    flow_mass = stream["flow_mass"]
+    solute = flow_mass * stream["mass_frac_ppm"] / 1e6
+    return flow_mass - solute, solute
+
+
+def _features(flow_mass, mass_frac_ppm, recovery):
+    # log scales so feeds an order of magnitude apart are far apart
+    return np.array([np.log(flow_mass), np.log(mass_frac_ppm), recovery])
+
+
+class RecycleGuessPredictor:
+    # inverse-distance weighting over the n_neighbors closest samples; with
+    # apply_pressures, initialize() also fixes the predicted pump pressures
+
+    def __init__(self, n_neighbors=3, apply_pressures=False):
+        self.n_neighbors = n_neighbors
+        self.apply_pressures = apply_pressures
+        self._samples = {}
+
+    @classmethod
+    def from_files(cls, pattern, **kwargs):
+        """Train on save_state() dumps (.npz or JSON) matching a glob pattern."""
+        predictor = cls(**kwargs)
+        for filename in sorted(glob.glob(pattern)):
+            predictor.add(load_state_data(filename))
+        return predictor
+
+    @classmethod
+    def from_store(cls, store, **kwargs):
+        """Train on every successful payload in a SweepStore."""
+        predictor = cls(**kwargs)
+        for record in store.records():
+            payload = record.get("payload")
+            if isinstance(payload, dict) and "error" not in payload:
+                predictor.add(payload)
+        return predictor
+
+    def add(self, data):
+        stages = _stage_keys(data)
+        if not stages:
+            return
+        feed = data["Feed"]
+        features = _features(feed["flow_mass"], feed["mass_frac_ppm"], data["Recovery"])
+
+        targets = {}
+        for stage in stages:
+            stage_data = data[stage]
+            target = {"pressure": stage_data["PrimaryPump"]["out"]["pressure_bar"] * 1e5}
+            if "Mixer" in stage_data:
+                solvent_up, solute_up = _solvent_solute(stage_data["PrimaryPump"]["out"])
+                solvent_rec, solute_rec = _solvent_solute(stage_data["Mixer"]["recycle"])
+                target["solvent_multiplier"] = solvent_rec / solvent_up
+                target["solute_multiplier"] = solute_rec / solute_up
+            targets[int(stage)] = target
+
+        self._samples.setdefault(len(stages), []).append((features, targets))
+
+    def __len__(self):
+        return sum(len(samples) for samples in self._samples.values())
+
+    def predict(self, m, water_recovery=None):
+        """{stage: {"solvent_multiplier", "solute_multiplier", "pressure"}}, or None."""
+        samples = self._samples.get(int(value(m.fs.NumberOfStages)))
+        if not samples:
+            return None
+
+        flow = m.fs.feed.flow_mass_phase_comp
+        flow_mass = value(flow[0, "Liq", "H2O"] + flow[0, "Liq", "TDS"])
+        mass_frac_ppm = value(flow[0, "Liq", "TDS"]) / flow_mass * 1e6
+        query = _features(
+            flow_mass, mass_frac_ppm, 0 if water_recovery is None else water_recovery
+        )
+
+        X = np.array([features for features, _ in samples])
+        if water_recovery is None:
+            X[:, 2] = 0
+        distance = np.linalg.norm(X - query, axis=1)
+        nearest = np.argsort(distance)[: self.n_neighbors]
+        if distance[nearest[0]] == 0:
+            weights = {nearest[0]: 1.0}
+        else:
+            weights = {i: 1 / distance[i] for i in nearest}
+        total = sum(weights.values())
+
+        prediction = {}
+        for i, weight in weights.items():
+            for stage, target in samples[i][1].items():
+                guess = prediction.setdefault(stage, {})
+                for name, val in target.items():
+                    guess[name] = guess.get(name, 0.0) + weight / total * val
+        return prediction
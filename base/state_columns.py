@@ -0,0 +1,66 @@
+# Every Var of a solved flowsheet read once into NumPy columns, saved as .npz
+# together with the get_state_data() summary.
+
+import json
+
+import numpy as np
+
+from pyomo.environ import Var
+
+
+class StateColumns:
+    # parallel arrays of full names, values (NaN if unset) and fixed flags
+
+    def __init__(self, names, values, fixed):
+        self.names = names
+        self.values = values
+        self.fixed = fixed
+        self._index = {name: i for i, name in enumerate(names.tolist())}
+
+    @classmethod
+    def from_model(cls, m):
+        variables = list(m.component_data_objects(Var, descend_into=True))
+        names = np.array([v.name for v in variables])
+        values = np.array(
+            [np.nan if v.value is None else v.value for v in variables], dtype=float
+        )
+        fixed = np.array([v.fixed for v in variables], dtype=bool)
+        return cls(names, values, fixed)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, component):
+        # a Var or its full name
+        name = component if isinstance(component, str) else component.name
+        return self.values[self._index[name]]
+
+    def select(self, prefix):
+        """(names, values) of every variable whose name starts with prefix."""
+        mask = np.char.startswith(self.names, prefix)
+        return self.names[mask], self.values[mask]
+
+    def save(self, filename, summary=None):
+        np.savez_compressed(
+            filename,
+            names=self.names,
+            values=self.values,
+            fixed=self.fixed,
+            summary=np.array(json.dumps(summary if summary is not None else {})),
+        )
+
+    @classmethod
+    def load(cls, filename):
+        """(StateColumns, summary dict) from a file written by save()."""
+        with np.load(filename) as f:
+            columns = cls(f["names"], f["values"], f["fixed"])
+            summary = json.loads(str(f["summary"]))
+        return columns, summary
+
+
+def load_state_data(filename):
+    # the summary dict of a saved state, from a .npz or a JSON dump
+    if filename.endswith(".npz"):
+        return StateColumns.load(filename)[1]
+    with open(filename) as f:
+        return json.load(f)
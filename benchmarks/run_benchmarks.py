@@ -0,0 +1,253 @@
+# Benchmarks for the NF_ZO, RO_1D_Dhe and LSRRO flowsheets.
+#
+# Every case runs in its own Python process, started in the flowsheet's
+# directory: Train0 and base both ship a module called NF_ZO that reads
+# ../solute_parameters.json, and a fresh process also gives a clean peak
+# memory figure per case. Build, initialize and solve times, IPOPT iterations
+# and peak RSS (of Python and of the IPOPT child processes) are written to a JSON file and compared against a stored
+# baseline.
+#
+#   python benchmarks/run_benchmarks.py                      # run everything
+#   python benchmarks/run_benchmarks.py --only lsrro --stages 1 2 --elements 5 10
+#   python benchmarks/run_benchmarks.py --save-baseline      # accept as baseline
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+# metrics compared against the baseline, and whether they are timings
+COMPARED_METRICS = {
+    "build": True,
+    "initialize": True,
+    "solve": True,
+    "ipopt_iterations": False,
+}
+
+
+def _peak_memory_mb(who=resource.RUSAGE_SELF):
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _timed_solve(solver, m, results, name="solve"):
+    # solve m, adding wall time and IPOPT iterations to the results
+    from solver_stats import solve_with_stats
+
+    res, stats = solve_with_stats(solver, m)
+    results[name] = results.get(name, 0.0) + stats["wall_time"]
+    if stats["iterations"] is not None:
+        results["ipopt_iterations"] = results.get("ipopt_iterations", 0) + stats["iterations"]
+    results["termination"] = stats["termination"]
+    return res
+
+
+def _bench_nf():
+    from pyomo.environ import ConcreteModel
+    from idaes.core import FlowsheetBlock
+    from idaes.core.solvers import get_solver
+    from NF_ZO import initialize_nanofiltration, nanofiltration
+
+    results = {}
+    start = time.perf_counter()
+    m = ConcreteModel()
+    m.fs = FlowsheetBlock(dynamic=False)
+    nanofiltration(m, initialize=False)
+    results["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    initialize_nanofiltration(m)
+    results["initialize"] = time.perf_counter() - start
+    _timed_solve(get_solver(), m, results)
+    return results
+
+
+def _bench_ro_1d_dhe(recovery=0.45):
+    from idaes.core.solvers import get_solver
+    import RO_1D_Dhe as ro
+
+    solver = get_solver()
+    solver.options["max_iter"] = 100000
+
+    results = {}
+    start = time.perf_counter()
+    m = ro._build_flowsheet()
+    results["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ro._initialize_flowsheet(m)
+    results["initialize"] = time.perf_counter() - start
+
+    _timed_solve(solver, m, results)
+    ro._set_up_optimization(m)
+    ro.fix_process_variable(m, "recovery", recovery)
+    _timed_solve(solver, m, results)
+    return results
+
+
+def _bench_lsrro(number_of_stages, number_of_RO_finite_elements):
+    from watertap.core.solvers import get_solver
+    import lsrro_base as lsrro
+
+    results = {}
+    start = time.perf_counter()
+    m = lsrro.build(
+        number_of_stages=number_of_stages,
+        number_of_RO_finite_elements=number_of_RO_finite_elements,
+        B_max=3.5e-6,
+    )
+    lsrro.set_operating_conditions(m, Cin=70, Qin=1e-1)
+    results["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lsrro.initialize(m, verbose=False)
+    # scaled as in _set_up_lsrro_case, so the solves time the production path
+    lsrro.autoscale(m)
+    results["initialize"] = time.perf_counter() - start
+
+    solver = get_solver()
+    _timed_solve(solver, m, results)
+    lsrro.optimize_set_up(
+        m,
+        set_default_bounds_on_module_dimensions=True,
+        water_recovery=0.45,
+        A_case=lsrro.ACase.optimize,
+        B_case=lsrro.BCase.optimize,
+        AB_tradeoff=lsrro.ABTradeoff.equality_constraint,
+        permeate_quality_limit=500e-6,
+        AB_gamma_factor=1,
+        B_max=3.5e-6,
+    )
+    _timed_solve(solver, m, results)
+    return results
+
+
+def _case_spec(name):
+    # (flowsheet directory, benchmark function, arguments) for a case name
+    if name == "nf":
+        return "Train0", _bench_nf, ()
+    if name == "ro_1d_dhe":
+        return "Train0", _bench_ro_1d_dhe, ()
+    match = re.fullmatch(r"lsrro_s(\d+)_fe(\d+)", name)
+    if match:
+        return "base", _bench_lsrro, (int(match.group(1)), int(match.group(2)))
+    raise ValueError(f"Unknown benchmark case {name}")
+
+
+def run_case_in_process(name):
+    directory, func, args = _case_spec(name)
+    directory = os.path.join(REPO_ROOT, directory)
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    sys.path.insert(1, REPO_ROOT)
+    from sweep_store import describe_error
+
+    try:
+        results = func(*args)
+    except Exception as err:
+        results = {"error": describe_error(err)}
+    # IPOPT runs as a child process, its factorization memory only shows up
+    # under RUSAGE_CHILDREN
+    results["python_peak_memory_mb"] = _peak_memory_mb(resource.RUSAGE_SELF)
+    results["solver_peak_memory_mb"] = _peak_memory_mb(resource.RUSAGE_CHILDREN)
+    results["peak_memory_mb"] = max(
+        results["python_peak_memory_mb"], results["solver_peak_memory_mb"]
+    )
+    print(RESULT_MARKER + json.dumps(results), flush=True)
+
+
+def run_case(name):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", name],
+        capture_output=True,
+        text=True,
+    )
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {"error": f"benchmark process exited with {proc.returncode}: {proc.stderr[-2000:]}"}
+
+
+def compare(results, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than tolerance."""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if "error" in result and "error" not in reference:
+            regressions.append((name, "error", None, result["error"]))
+            continue
+        for metric, is_timing in COMPARED_METRICS.items():
+            old, new = reference.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            limit = old * (1 + tolerance) if is_timing else old
+            if new > limit:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flowsheet benchmarks")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--only", nargs="+", choices=["nf", "ro_1d_dhe", "lsrro"])
+    parser.add_argument("--stages", nargs="+", type=int, default=[1, 2, 3, 4, 5])
+    parser.add_argument("--elements", nargs="+", type=int, default=[5, 10, 20, 40])
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed relative slowdown"
+    )
+    args = parser.parse_args(argv)
+
+    if args.case:
+        run_case_in_process(args.case)
+        return 0
+
+    groups = args.only or ["nf", "ro_1d_dhe", "lsrro"]
+    names = [g for g in groups if g != "lsrro"]
+    if "lsrro" in groups:
+        names += [f"lsrro_s{s}_fe{fe}" for s in args.stages for fe in args.elements]
+
+    results = {}
+    for name in names:
+        print(f"Running {name} ...", flush=True)
+        results[name] = run_case(name)
+        print(f"  {results[name]}", flush=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against, run with --save-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: {old} -> {new}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+# Batch LCOW re-evaluation over economic scenarios at a fixed design.
+#
+# Once a flowsheet is solved, the costing is a function of the (now fixed)
+# process variables and a handful of economic inputs. Costing variables are
+# expanded through the `var == expr` equality constraints that define them in
+# the costing blocks, every other variable and Param is frozen at its solved
+# value, and the selected economic inputs are replaced by NumPy arrays. The
+# resulting expression trees are evaluated once per batch with array
+# arithmetic, so no solver is involved.
+#
+# This holds for economic inputs that do not feed back into the design: the
+# results are the cost of the given design under each scenario, not of a
+# re-optimized one. Costing variables defined any other way are frozen at their
+# solved values and listed by frozen_costing_variables(); validate() checks the
+# evaluation against re-solves of the costing with perturbed inputs.
+import numpy as np
+
+from pyomo.common.collections import ComponentMap
+from pyomo.core.expr.numeric_expr import (
+    Expr_ifExpression,
+    ExternalFunctionExpression,
+    UnaryFunctionExpression,
+)
+from pyomo.core.expr.relational_expr import EqualityExpression
+from pyomo.core.expr.visitor import StreamBasedExpressionVisitor
+from pyomo.environ import Constraint, Objective, Var, check_optimal_termination, value
+from pyomo.util.subsystems import TemporarySubsystemManager
+from pyomo.common.numeric_types import native_types
+
+_UNARY_FUNCTIONS = {
+    "log": np.log,
+    "log10": np.log10,
+    "exp": np.exp,
+    "sqrt": np.sqrt,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "asin": np.arcsin,
+    "acos": np.arccos,
+    "atan": np.arctan,
+    "sinh": np.sinh,
+    "cosh": np.cosh,
+    "tanh": np.tanh,
+    "asinh": np.arcsinh,
+    "acosh": np.arccosh,
+    "atanh": np.arctanh,
+    "ceil": np.ceil,
+    "floor": np.floor,
+    "abs": np.abs,
+}
+
+# economic inputs looked up by default_parameters(), relative to the
+# WaterTAP costing block
+WATERTAP_PARAMETERS = [
+    "electricity_cost",
+    "capital_recovery_factor",
+    "reverse_osmosis.membrane_cost",
+    "reverse_osmosis.high_pressure_membrane_cost",
+    "high_pressure_pump.cost",
+]
+
+# cost outputs looked up by default_targets()
+TARGETS = [
+    "fs.costing.primary_pump_capex_lcow",
+    "fs.costing.booster_pump_capex_lcow",
+    "fs.costing.erd_capex_lcow",
+    "fs.costing.electricity_lcow",
+    "fs.costing.membrane_aggregate_lcow",
+    "fs.costing.LCOW",
+    "fs.costing.prommis_LCOW",
+    "fs.prommis_costing.LCOW",
+    "fs.prommis_costing.annualized_cost",
+    "fs.costing2.annualized_cost",
+]
+
+
+def in_costing_block(component):
+    # whether a component sits in a block whose name contains "costing"
+    block = component.parent_block()
+    while block is not None:
+        if "costing" in block.local_name:
+            return True
+        block = block.parent_block()
+    return False
+
+
+def _is_variable(obj):
+    return hasattr(obj, "is_variable_type") and obj.is_variable_type()
+
+
+def costing_definitions(m):
+    """
+    ComponentMap of unfixed costing variables to the expressions defining
+    them, taken from active `var == expr` (or `expr == var`) constraints in
+    costing blocks. Costing variables defined any other way are held at
+    their solved values.
+    """
+    definitions = ComponentMap()
+    for con in m.component_data_objects(Constraint, active=True, descend_into=True):
+        if not isinstance(con.expr, EqualityExpression) or not in_costing_block(con):
+            continue
+        lhs, rhs = con.expr.args
+        for var, definition in ((lhs, rhs), (rhs, lhs)):
+            if _is_variable(var) and not var.fixed and var not in definitions:
+                definitions[var] = definition
+                break
+    return definitions
+
+
+def frozen_costing_variables(m, definitions=None):
+    """
+    Unfixed variables of the costing blocks that costing_definitions() could
+    not define, and that are therefore held at their solved values.
+    """
+    if definitions is None:
+        definitions = costing_definitions(m)
+    return [
+        v
+        for v in m.component_data_objects(Var, descend_into=True)
+        if not v.fixed and v not in definitions and in_costing_block(v)
+    ]
+
+
+def default_parameters(m):
+    """
+    {name: component} of the economic inputs present in a solved LSRRO or
+    RO_1D_Dhe model: the WaterTAP prices in WATERTAP_PARAMETERS and the
+    QGESS land cost and labor rates.
+    """
+    parameters = {}
+    for name in WATERTAP_PARAMETERS:
+        component = m.fs.costing.find_component(name)
+        if component is not None:
+            parameters[f"fs.costing.{name}"] = component
+    land_cost = m.fs.find_component("land_cost")
+    if land_cost is not None:
+        parameters[land_cost.name] = land_cost
+    for block_name in ("prommis_costing", "costing2"):
+        block = m.fs.find_component(block_name)
+        labor_rate = None if block is None else block.find_component("labor_rate")
+        if labor_rate is not None and hasattr(labor_rate, "items"):
+            for data in labor_rate.values():
+                parameters[data.name] = data
+    return parameters
+
+
+def default_targets(m):
+    """{name: component} of the TARGETS present in a model."""
+    targets = {}
+    for name in TARGETS:
+        component = m.find_component(name)
+        if component is not None:
+            targets[name] = component
+    return targets
+
+
+class _ArrayEvaluator(StreamBasedExpressionVisitor):
+    def __init__(self, engine, substitutions, memo):
+        super().__init__()
+        self.engine = engine
+        self.substitutions = substitutions
+        self.memo = memo
+
+    def beforeChild(self, node, child, child_idx):
+        if type(child) in native_types:
+            return False, child
+        if not child.is_expression_type():
+            return False, self.engine._leaf(child, self.substitutions, self.memo)
+        if child.is_named_expression_type() and id(child) in self.memo:
+            return False, self.memo[id(child)]
+        return True, None
+
+    def exitNode(self, node, data):
+        if isinstance(node, UnaryFunctionExpression):
+            result = _UNARY_FUNCTIONS[node.getname()](data[0])
+        elif isinstance(node, Expr_ifExpression):
+            result = np.where(data[0], data[1], data[2])
+        elif isinstance(node, ExternalFunctionExpression):
+            raise TypeError(f"Cannot vectorize external function {node.getname()}")
+        elif type(node).__name__.endswith("MaxExpression"):
+            result = np.maximum.reduce(np.broadcast_arrays(*data))
+        elif type(node).__name__.endswith("MinExpression"):
+            result = np.minimum.reduce(np.broadcast_arrays(*data))
+        else:
+            result = node._apply_operation(data)
+        if node.is_named_expression_type():
+            self.memo[id(node)] = result
+        return result
+
+
+class LCOWScenarioEvaluator:
+    """
+    Evaluate costing expressions of a solved model over arrays of economic
+    inputs.
+
+    Parameters
+    ----------
+    m : ConcreteModel
+        A solved LSRRO or RO_1D_Dhe model.
+    parameters : dict, optional
+        {name: Var or mutable Param data} of the inputs that may vary between
+        scenarios, default_parameters(m) if not given.
+    targets : dict, optional
+        {name: expression} of the outputs, default_targets(m) if not given.
+
+    Costing variables without a `var == expr` definition are listed in
+    frozen; they do not respond to the parameters.
+    """
+
+    def __init__(self, m, parameters=None, targets=None):
+        self.model = m
+        self.parameters = default_parameters(m) if parameters is None else parameters
+        self.targets = default_targets(m) if targets is None else targets
+        self.definitions = costing_definitions(m)
+        self.frozen = frozen_costing_variables(m, self.definitions)
+        if self.frozen:
+            print(
+                f"Warning: {len(self.frozen)} costing variables are not defined by "
+                f"a `var == expr` constraint and are frozen at their solved values: "
+                + ", ".join(v.name for v in self.frozen[:10])
+                + (", ..." if len(self.frozen) > 10 else "")
+            )
+
+    def _leaf(self, node, substitutions, memo):
+        if id(node) in substitutions:
+            return substitutions[id(node)]
+        if _is_variable(node):
+            if node in self.definitions:
+                if id(node) not in memo:
+                    memo[id(node)] = None  # guards against circular definitions
+                    memo[id(node)] = self._evaluate(
+                        self.definitions[node], substitutions, memo
+                    )
+                elif memo[id(node)] is None:
+                    raise ValueError(f"Circular costing definition of {node.name}")
+                return memo[id(node)]
+            return np.nan if node.value is None else node.value
+        # Params, units (value 1) and other constant leaves
+        return value(node)
+
+    def _evaluate(self, expr, substitutions, memo):
+        if type(expr) in native_types:
+            return expr
+        if not expr.is_expression_type():
+            return self._leaf(expr, substitutions, memo)
+        return _ArrayEvaluator(self, substitutions, memo).walk_expression(expr)
+
+    def evaluate(self, scenarios=None):
+        """
+        Target values for a batch of scenarios.
+
+        scenarios is a {parameter name: array} dict of equal-length (or
+        broadcastable) arrays; parameters not listed stay at their solved
+        values. Returns {target name: array}.
+        """
+        scenarios = scenarios or {}
+        unknown = set(scenarios) - set(self.parameters)
+        if unknown:
+            raise KeyError(f"Unknown economic parameters: {sorted(unknown)}")
+        substitutions = {
+            id(self.parameters[name]): np.asarray(values, dtype=float)
+            for name, values in scenarios.items()
+        }
+        shape = np.broadcast_shapes(*(v.shape for v in substitutions.values()))
+
+        memo = {}
+        return {
+            name: np.broadcast_to(self._evaluate(expr, substitutions, memo), shape)
+            for name, expr in self.targets.items()
+        }
+
+    def grid(self, **axes):
+        """
+        Evaluate the full factorial combination of the given parameter
+        values; returns ({parameter name: array}, {target name: array}) with
+        one entry per combination.
+        """
+        names = list(axes)
+        mesh = np.meshgrid(*(np.asarray(axes[n], dtype=float) for n in names), indexing="ij")
+        scenarios = {name: grid.ravel() for name, grid in zip(names, mesh)}
+        return scenarios, self.evaluate(scenarios)
+
+    def _resolve_costing(self, solver):
+        # re-solve the costing of the model at the current parameter values
+        # with every process variable fixed; {target name: value}
+        m = self.model
+        to_fix = [
+            v
+            for v in m.component_data_objects(Var, descend_into=True)
+            if not v.fixed and not in_costing_block(v)
+        ]
+        to_deactivate = [
+            c
+            for c in m.component_data_objects(Constraint, active=True, descend_into=True)
+            if not in_costing_block(c)
+        ]
+        to_deactivate.extend(m.component_data_objects(Objective, active=True))
+        with TemporarySubsystemManager(to_fix=to_fix, to_deactivate=to_deactivate):
+            results = solver.solve(m)
+        if not check_optimal_termination(results):
+            raise RuntimeError(
+                f"Costing re-solve failed: {results.solver.termination_condition}"
+            )
+        return {name: value(expr) for name, expr in self.targets.items()}
+
+    def validate(self, rel_step=0.1, rtol=1e-5, solver=None):
+        """
+        Check the evaluation against the model: each parameter in turn is
+        changed by rel_step on the model, the costing is re-solved with the
+        process variables fixed, and the targets are compared with evaluate()
+        at the same value. Costing that was frozen instead of expanded shows
+        up as a mismatch.
+
+        Raises ValueError listing every {(parameter, target): (model value,
+        evaluated)} that differs by more than rtol. The model values are
+        restored afterwards.
+        """
+        if solver is None:
+            from idaes.core.solvers import get_solver
+
+            solver = get_solver()
+        m = self.model
+        saved = ComponentMap(
+            (v, v.value) for v in m.component_data_objects(Var, descend_into=True)
+        )
+
+        mismatches = {}
+
+        def compare(parameter, expected, evaluated):
+            for name in self.targets:
+                got = float(np.ravel(evaluated[name])[0])
+                want = expected[name]
+                if abs(got - want) > rtol * max(abs(want), 1e-12):
+                    mismatches[(parameter, name)] = (want, got)
+
+        compare(None, {n: value(e) for n, e in self.targets.items()}, self.evaluate())
+        for name, component in self.parameters.items():
+            base = value(component)
+            step = base * (1 + rel_step) if base != 0 else rel_step
+            try:
+                component.set_value(step)
+                expected = self._resolve_costing(solver)
+            finally:
+                component.set_value(base)
+                for v, val in saved.items():
+                    v.set_value(val, skip_validation=True)
+            compare(name, expected, self.evaluate({name: [step]}))
+
+        if mismatches:
+            raise ValueError(
+                "LCOW scenario evaluation does not match the model:\n"
+                + "\n".join(
+                    f"  {parameter or 'solved point'} -> {target}: "
+                    f"model {want:.6g}, evaluated {got:.6g}"
+                    for (parameter, target), (want, got) in mismatches.items()
+                )
+            )
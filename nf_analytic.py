@@ -0,0 +1,154 @@
+# Closed-form zero-order nanofiltration for many feeds at once.
+#
+# With fixed solute rejections, a fixed volumetric recovery and one free ion
+# whose rejection closes retentate electroneutrality, NF_ZO.nanofiltration is
+# a mass balance:
+#
+#   permeate solute flow    m_p,j = r (1 - R_j) m_in,j
+#   retentate solute flow   m_r,j = m_in,j - m_p,j
+#   sum_j z_j m_r,j / mw_j = 0  ->  R_free in closed form
+#   pump work               W = V_in (P_out - P_in) / efficiency
+#
+# Densities are taken as constant (the MCAS default), so volumetric recovery
+# is also mass recovery. Feeds are rows of a NumPy array, so thousands of
+# compositions evaluate in one call.
+import json
+
+import numpy as np
+
+SOLUTE_PARAMETERS_FILE = "../solute_parameters.json"
+
+
+def load_solute_parameters(filename=SOLUTE_PARAMETERS_FILE):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def solute_flow_matrix(rows, solutes):
+    """
+    (n_feeds, n_solutes) array of solute mass flows [kg/s] from a list of
+    {solute: mass flow} dicts; missing solutes are zero.
+    """
+    return np.array([[row.get(j, 0.0) for j in solutes] for row in rows], dtype=float)
+
+
+def nanofiltration_analytic(
+    h2o_flow,
+    solute_flows,
+    parameters,
+    free_ion="Cl",
+    recovery=0.5,
+    pump_outlet_pressure=10e5,
+    feed_pressure=101325,
+    pump_efficiency=0.8,
+    density=1000,
+):
+    """
+    Evaluate the zero-order NF train for a batch of feeds.
+
+    Parameters
+    ----------
+    h2o_flow : float or array of shape (n_feeds,)
+        Feed water mass flow [kg/s].
+    solute_flows : array of shape (n_feeds, n_solutes) or (n_solutes,)
+        Feed solute mass flows [kg/s], columns in the order of parameters.
+    parameters : dict
+        solute_parameters.json style {solute: {"charge", "mw",
+        "rejection_phase_comp", ...}}.
+    free_ion : str
+        Solute whose rejection is set by retentate electroneutrality.
+
+    Returns
+    -------
+    dict of arrays: "Permeate Flow" and "Retentate Flow" [m3/s],
+    "<free_ion> Rejection" [-], "Pump Work" [W], and the per-solute
+    "Permeate Solute Flow" and "Retentate Solute Flow" [kg/s] of shape
+    (n_feeds, n_solutes).
+    """
+    solutes = list(parameters)
+    solute_flows = np.atleast_2d(np.asarray(solute_flows, dtype=float))
+    h2o_flow = np.broadcast_to(np.asarray(h2o_flow, dtype=float), solute_flows.shape[:1])
+    charge = np.array([parameters[j]["charge"] for j in solutes], dtype=float)
+    mw = np.array([parameters[j]["mw"] for j in solutes], dtype=float)
+    rejection = np.array(
+        [parameters[j].get("rejection_phase_comp", 0.0) for j in solutes], dtype=float
+    )
+    free = solutes.index(free_ion)
+    fixed = np.arange(len(solutes)) != free
+    if np.any(solute_flows[:, free] == 0):
+        raise ValueError(
+            f"The free ion {free_ion} needs a nonzero feed flow to balance the retentate charge"
+        )
+
+    # retentate electroneutrality: the fixed-rejection ions leave a net charge
+    # that the free ion's retentate flow has to balance
+    retained = 1 - recovery * (1 - rejection)
+    net_charge = (solute_flows[:, fixed] * retained[fixed] * charge[fixed] / mw[fixed]).sum(axis=1)
+    free_retained = -net_charge * mw[free] / (charge[free] * solute_flows[:, free])
+    free_rejection = 1 - (1 - free_retained) / recovery
+
+    rejections = np.tile(rejection, (len(solute_flows), 1))
+    rejections[:, free] = free_rejection
+    permeate_solute = recovery * (1 - rejections) * solute_flows
+    retentate_solute = solute_flows - permeate_solute
+
+    feed_volume = (h2o_flow + solute_flows.sum(axis=1)) / density
+    return {
+        "Permeate Flow": recovery * feed_volume,
+        "Retentate Flow": (1 - recovery) * feed_volume,
+        f"{free_ion} Rejection": free_rejection,
+        "Pump Work": feed_volume * (pump_outlet_pressure - feed_pressure) / pump_efficiency,
+        "Permeate Solute Flow": permeate_solute,
+        "Retentate Solute Flow": retentate_solute,
+    }
+
+
+def validate_against_model(model, unit_name="unit", pump_name="P1", free_ion="Cl", rtol=1e-3):
+    """
+    Compare the analytic result with a solved NF_ZO model.
+
+    The feed, rejections, recovery, pressures and efficiency are read from
+    the model. Returns {quantity: (model value, analytic value, relative
+    error)}; quantities off by more than rtol are printed.
+    """
+    from pyomo.environ import value
+
+    unit = getattr(model.fs, unit_name)
+    pump = getattr(model.fs, pump_name)
+    inlet = unit.feed_side.properties_in[0]
+    params = inlet.params
+    solutes = [j for j in params.solute_set]
+    parameters = {
+        j: {
+            "charge": value(params.charge_comp[j]),
+            "mw": value(params.mw_comp[j]),
+            "rejection_phase_comp": value(unit.rejection_phase_comp[0, "Liq", j]),
+        }
+        for j in solutes
+    }
+    analytic = nanofiltration_analytic(
+        value(inlet.flow_mass_phase_comp["Liq", "H2O"]),
+        [value(inlet.flow_mass_phase_comp["Liq", j]) for j in solutes],
+        parameters,
+        free_ion=free_ion,
+        recovery=value(unit.recovery_vol_phase[0, "Liq"]),
+        pump_outlet_pressure=value(pump.control_volume.properties_out[0].pressure),
+        feed_pressure=value(pump.control_volume.properties_in[0].pressure),
+        pump_efficiency=value(pump.efficiency_pump[0]),
+        density=value(inlet.dens_mass_phase["Liq"]),
+    )
+    expected = {
+        "Permeate Flow": value(unit.properties_permeate[0].flow_vol_phase["Liq"]),
+        "Retentate Flow": value(unit.feed_side.properties_out[0].flow_vol_phase["Liq"]),
+        f"{free_ion} Rejection": value(unit.rejection_phase_comp[0, "Liq", free_ion]),
+        "Pump Work": value(pump.work_mechanical[0]),
+    }
+
+    comparison = {}
+    for name, model_value in expected.items():
+        analytic_value = float(analytic[name][0])
+        error = abs(analytic_value - model_value) / max(abs(model_value), 1e-12)
+        comparison[name] = (model_value, analytic_value, error)
+        if error > rtol:
+            print(f"{name}: model {model_value:.6g}, analytic {analytic_value:.6g}")
+    return comparison
@@ -0,0 +1,45 @@
+# Persistent APPSI IPOPT for models that are re-solved many times. APPSI does
+# not export scaling_factor suffixes, so constraint scaling is moved into the
+# model when attaching; variables fall back to gradient-based scaling.
+import idaes.core.util.scaling as iscale
+from pyomo.environ import Constraint, SolverFactory
+
+DEFAULT_OPTIONS = {
+    "tol": 1e-8,
+    "constr_viol_tol": 1e-8,
+    "bound_push": 1e-8,
+    "nlp_scaling_method": "gradient-based",
+}
+
+
+def transform_constraint_scaling(model):
+    # apply constraint scaling factors to the constraints themselves and drop
+    # the suffix entries, so user-scaling does not apply them twice
+    for con in model.component_data_objects(Constraint, active=True, descend_into=True):
+        sf = iscale.get_scaling_factor(con)
+        if sf is not None:
+            iscale.constraint_scaling_transform(con, sf, overwrite=False)
+            iscale.unset_scaling_factor(con)
+
+
+def attach_persistent_solver(model, options=None):
+    """The APPSI IPOPT attached to a model; attach once it is scaled and has an objective."""
+    solver = getattr(model, "_persistent_solver", None)
+    if solver is None:
+        solver = SolverFactory("appsi_ipopt")
+        if not solver.available():
+            raise RuntimeError("appsi_ipopt is not available, is ipopt on the PATH?")
+        for name, val in dict(DEFAULT_OPTIONS, **(options or {})).items():
+            solver.options[name] = val
+        transform_constraint_scaling(model)
+        model._persistent_solver = solver
+    elif options:
+        for name, val in options.items():
+            solver.options[name] = val
+    return solver
+
+
+def attached_solver(model, default=None):
+    """The persistent solver attached to a model, or default if there is none."""
+    solver = getattr(model, "_persistent_solver", None)
+    return default if solver is None else solver
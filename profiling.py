@@ -0,0 +1,70 @@
+# Lightweight phase timing for flowsheet runs.
+#
+# A PhaseProfiler records wall and CPU time for named, nestable phases (model
+# build, unit initializations, solves, ...). CPU time includes finished child
+# processes, so time spent inside the IPOPT executable is counted. The
+# overhead is a few timer calls per phase, so it can stay on in sweeps.
+import contextlib
+import csv
+import json
+import os
+import time
+
+
+def _cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class PhaseProfiler:
+    def __init__(self):
+        self.records = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the enclosed block; nested phases are recorded as outer/inner."""
+        self._stack.append(name)
+        path = "/".join(self._stack)
+        wall_start = time.perf_counter()
+        cpu_start = _cpu_time()
+        try:
+            yield
+        finally:
+            self.records.append(
+                {
+                    "phase": path,
+                    "wall": time.perf_counter() - wall_start,
+                    "cpu": _cpu_time() - cpu_start,
+                }
+            )
+            self._stack.pop()
+
+    def summary(self):
+        """Totals per phase path, in order of first occurrence."""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(
+                record["phase"], {"phase": record["phase"], "calls": 0, "wall": 0.0, "cpu": 0.0}
+            )
+            total["calls"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"]
+        return list(totals.values())
+
+    def to_json(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"summary": self.summary(), "records": self.records}, f, indent=4)
+
+    def to_csv(self, filename):
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["phase", "calls", "wall", "cpu"])
+            writer.writeheader()
+            writer.writerows(self.summary())
+
+
+def phase(profiler, name):
+    """profiler.phase(name), or a no-op context when profiler is None."""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.phase(name)
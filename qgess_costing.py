@@ -0,0 +1,94 @@
+# Shared QGESS costing set-up for the NF, RO and LSRRO flowsheets.
+#
+# All flowsheets cost their WaterTAP units with the same QGESS arguments;
+# only the costed blocks and the land cost differ. The costing block is built
+# and initialized once per model. The land cost is a mutable Param, so sweep
+# points that share a model only update its value instead of rebuilding and
+# re-initializing the labor, installation and owner's cost components.
+from pyomo.environ import Param, value
+
+from prommis.uky.costing.ree_plant_capcost import QGESSCosting, QGESSCostingData
+
+QGESS_ARGUMENTS = dict(
+    # arguments related to installation costs
+    piping_materials_and_labor_percentage=20,
+    electrical_materials_and_labor_percentage=20,
+    instrumentation_percentage=8,
+    plants_services_percentage=10,
+    process_buildings_percentage=40,
+    auxiliary_buildings_percentage=15,
+    site_improvements_percentage=10,
+    equipment_installation_percentage=17,
+    field_expenses_percentage=12,
+    project_management_and_construction_percentage=30,
+    process_contingency_percentage=15,
+    # argument related to Fixed OM costs
+    labor_types=[
+        "skilled",
+        "unskilled",
+        "supervisor",
+        "maintenance",
+        "technician",
+        "engineer",
+    ],
+    labor_rate=[24.98, 19.08, 30.39, 22.73, 21.97, 45.85],  # USD/hr
+    labor_burden=25,  # % fringe benefits
+    operators_per_shift=[4, 9, 2, 2, 2, 3],
+    hours_per_shift=8,
+    shifts_per_day=3,
+    operating_days_per_year=336,
+    mixed_product_sale_price_realization_factor=0.65,  # 65% price realization for mixed products
+    # arguments related to total owners costs
+    resources=[],
+    rates=[],
+    fixed_OM=True,
+    variable_OM=True,
+    feed_input=None,
+    efficiency=0.80,  # power usage efficiency, or fixed motor/distribution efficiency
+    waste=[],
+    recovery_rate_per_year=None,
+    CE_index_year="UKy_2019",
+)
+
+
+def build_qgess_costing(fs, watertap_blocks, land_cost=1, name="costing2"):
+    """
+    Build and initialize the QGESS process costs of watertap_blocks on the
+    costing block fs.<name> (created if missing), with the land cost as the
+    mutable Param fs.land_cost.
+
+    If the block was already built for the same units, only the land cost is
+    updated. QGESS constraints are constructed from the unit list, so a block
+    built for other units cannot be re-pointed and raises a ValueError.
+    """
+    block = fs.find_component(name)
+    if block is None:
+        block = QGESSCosting()
+        fs.add_component(name, block)
+
+    unit_names = tuple(unit.name for unit in watertap_blocks)
+    built_for = getattr(block, "_qgess_watertap_blocks", None)
+    if built_for is not None:
+        if built_for != unit_names:
+            raise ValueError(
+                f"{block.name} was built for {built_for}, cannot re-point it to {unit_names}"
+            )
+        update_qgess_costing(fs, land_cost)
+        return block
+
+    fs.land_cost = Param(initialize=land_cost, mutable=True)
+    block.build_process_costs(
+        land_cost=fs.land_cost,
+        watertap_blocks=list(watertap_blocks),
+        **QGESS_ARGUMENTS,
+    )
+    QGESSCostingData.costing_initialization(block)
+    QGESSCostingData.initialize_fixed_OM_costs(block)
+    block._qgess_watertap_blocks = unit_names
+    return block
+
+
+def update_qgess_costing(fs, land_cost=None):
+    """Set a new land cost on a flowsheet costed with build_qgess_costing."""
+    if land_cost is not None and land_cost != value(fs.land_cost):
+        fs.land_cost.set_value(land_cost)
@@ -0,0 +1,165 @@
+# Structured IPOPT statistics for flowsheet solves.
+#
+# Solves are run with an IPOPT log file (APPSI solvers reject logfile=, their
+# streamed output is captured instead), which is parsed into a flat record
+# (iterations, total time in IPOPT, final constraint violation, exit status,
+# termination condition). Records are attached to the
+# model that was solved and end up in the flowsheet result dicts, so a sweep
+# can be summarized without reading any logs.
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+# pyomo is imported by the solve helpers only, so logs can be parsed without it
+
+_PATTERNS = {
+    "iterations": (r"Number of Iterations\.*:\s*(\d+)", int),
+    # scaled and unscaled values are reported, keep the unscaled one
+    "constraint_violation": (
+        r"Constraint violation\.*:\s*[-+.\deE]+\s+([-+.\deE]+)",
+        float,
+    ),
+    "exit_status": (r"EXIT:\s*(.+)", str),
+}
+
+
+# IPOPT >= 3.14 only prints the total, 3.13 splits it into the time in IPOPT
+# and in function evaluations
+_TOTAL_TIME = r"Total seconds in IPOPT\s*=\s*([-+.\deE]+)"
+_SPLIT_TIMES = [
+    r"Total CPU secs in IPOPT \(w/o function evaluations\)\s*=\s*([-+.\deE]+)",
+    r"Total CPU secs in NLP function evaluations\s*=\s*([-+.\deE]+)",
+]
+
+
+def _last(pattern, text, convert):
+    matches = re.findall(pattern, text)
+    return convert(matches[-1].strip()) if matches else None
+
+
+def parse_ipopt_log(text):
+    """Statistics found in the text of an IPOPT log, missing ones as None."""
+    stats = {}
+    for name, (pattern, convert) in _PATTERNS.items():
+        stats[name] = _last(pattern, text, convert)
+    total = _last(_TOTAL_TIME, text, float)
+    if total is None:
+        split = [_last(pattern, text, float) for pattern in _SPLIT_TIMES]
+        if None not in split:
+            total = sum(split)
+    stats["ipopt_time"] = total
+    return stats
+
+
+def _is_appsi(solver):
+    try:
+        from pyomo.contrib.appsi.base import LegacySolverInterface
+    except ImportError:
+        return False
+    return isinstance(solver, LegacySolverInterface)
+
+
+def _solve_logged(solver, model, tee, **kwargs):
+    # (results, IPOPT output text)
+    from pyomo.common.tee import capture_output
+    from pyomo.environ import check_optimal_termination
+
+    if _is_appsi(solver):
+        # streamed to sys.stdout, which capture_output redirects. APPSI raises
+        # when it loads a non-optimal solution, so the solution is only loaded
+        # after checking the termination.
+        kwargs.pop("load_solutions", None)
+        output = io.StringIO()
+        with capture_output(output=output):
+            results = solver.solve(model, tee=True, load_solutions=False, **kwargs)
+        text = output.getvalue()
+        if check_optimal_termination(results):
+            solver.load_vars()
+        if tee:
+            sys.stdout.write(text)
+        return results, text
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logfile = os.path.join(tmp, "ipopt.log")
+        results = solver.solve(model, tee=tee, logfile=logfile, **kwargs)
+        text = ""
+        if os.path.exists(logfile):
+            with open(logfile) as f:
+                text = f.read()
+    return results, text
+
+
+def solve_with_stats(solver, model, tee=False, label=None, **kwargs):
+    """solver.solve(model) with its IPOPT output logged; returns (results, stats)."""
+    from pyomo.environ import check_optimal_termination
+
+    start = time.perf_counter()
+    results, text = _solve_logged(solver, model, tee, **kwargs)
+    wall_time = time.perf_counter() - start
+
+    stats = {"label": label}
+    stats.update(parse_ipopt_log(text))
+    stats["wall_time"] = wall_time
+    stats["termination"] = str(results.solver.termination_condition)
+    stats["optimal"] = bool(check_optimal_termination(results))
+    return results, stats
+
+
+def record_solve(model, solver, tee=False, label=None, **kwargs):
+    """
+    Solve like solve_with_stats, append the stats to model._solver_stats and
+    return the solver results.
+    """
+    results, stats = solve_with_stats(solver, model, tee=tee, label=label, **kwargs)
+    if not hasattr(model, "_solver_stats"):
+        model._solver_stats = []
+    model._solver_stats.append(stats)
+    return results
+
+
+def take_solver_stats(model):
+    """The stats recorded on a model since the last call, clearing them."""
+    stats = list(getattr(model, "_solver_stats", []))
+    model._solver_stats = []
+    return stats
+
+
+def sweep_records(results, key="Solver Stats"):
+    """Flatten the stats of a {point: result dict} sweep, tagging each with its point."""
+    records = []
+    for point, result in results.items():
+        if isinstance(result, dict):
+            for stats in result.get(key, []):
+                records.append(dict(stats, point=point))
+    return records
+
+
+def summarize(records, top=5):
+    """
+    Aggregate solve records: counts, iteration and timing totals, and the
+    slowest and worst-converged solves.
+    """
+    def total(name):
+        return sum(r[name] for r in records if r.get(name) is not None)
+
+    iterations = [r["iterations"] for r in records if r.get("iterations") is not None]
+    violations = [
+        r for r in records if r.get("constraint_violation") is not None
+    ]
+    return {
+        "solves": len(records),
+        "failed": sum(not r.get("optimal", False) for r in records),
+        "iterations_total": sum(iterations),
+        "iterations_mean": sum(iterations) / len(iterations) if iterations else None,
+        "iterations_max": max(iterations, default=None),
+        "wall_time": total("wall_time"),
+        "ipopt_time": total("ipopt_time"),
+        "failures": [r for r in records if not r.get("optimal", False)],
+        "slowest": sorted(records, key=lambda r: r.get("wall_time") or 0, reverse=True)[:top],
+        "worst_violation": sorted(
+            violations, key=lambda r: r["constraint_violation"], reverse=True
+        )[:top],
+    }
@@ -0,0 +1,94 @@
+# Append-only export of unit stream tables.
+#
+# Every run appends its stream table to one long-format CSV (run_id, source,
+# stream, variable, units, value) instead of writing its own file, so
+# parallel sweep points neither overwrite each other nor pay for an Excel
+# writer. Appends take an exclusive file lock where fcntl is available. Excel
+# workbooks are generated from the store on request.
+import csv
+import os
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows, appends are not locked
+    fcntl = None
+
+STREAM_TABLE_FILE = "stream_tables.csv"
+FIELDS = ["run_id", "source", "stream", "variable", "units", "value"]
+
+
+def make_run_id():
+    """Unique id for one run: timestamp, process id and a random suffix."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _long_rows(table, run_id, source):
+    # stream table DataFrame (variables x streams, optional Units column) to
+    # long-format rows
+    units = table["Units"] if "Units" in table.columns else None
+    for stream in table.columns:
+        if stream == "Units":
+            continue
+        for variable, val in table[stream].items():
+            yield {
+                "run_id": run_id,
+                "source": source,
+                "stream": stream,
+                "variable": variable,
+                "units": "" if units is None else str(units[variable]),
+                "value": val,
+            }
+
+
+def append_stream_table(table, run_id=None, source="", filename=STREAM_TABLE_FILE):
+    """
+    Append a _get_stream_table_contents() DataFrame to the store under
+    run_id (a new one if not given) and return the run id.
+    """
+    if run_id is None:
+        run_id = make_run_id()
+    rows = list(_long_rows(table, run_id, source))
+    with open(filename, "a", newline="") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            # tell() of an append handle is stale if another process wrote
+            # since it was opened, the size under the lock is not
+            if os.fstat(f.fileno()).st_size == 0:
+                writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    return run_id
+
+
+def read_stream_tables(filename=STREAM_TABLE_FILE, run_ids=None):
+    """The store as a long-format DataFrame, optionally only some runs."""
+    import pandas as pd
+
+    data = pd.read_csv(filename, dtype={"run_id": str})
+    if run_ids is not None:
+        data = data[data["run_id"].isin(list(run_ids))]
+    return data
+
+
+def excel_report(output, filename=STREAM_TABLE_FILE, run_ids=None):
+    """
+    Write the stream tables of the selected runs (all by default) to an
+    Excel workbook, one sheet per run in the original wide layout.
+    """
+    import pandas as pd
+
+    data = read_stream_tables(filename, run_ids)
+    with pd.ExcelWriter(output) as writer:
+        for run_id, run in data.groupby("run_id", sort=False):
+            table = run.pivot_table(
+                index=["variable", "units"], columns="stream", values="value", aggfunc="first"
+            )
+            # Excel limits sheet names to 31 characters
+            table.to_excel(writer, sheet_name=str(run_id)[-31:])
@@ -0,0 +1,60 @@
+# Append-only JSON-lines checkpoint store, so interrupted sweeps can resume.
+import hashlib
+import json
+import os
+
+
+def config_hash(config):
+    # stable short hash of a configuration dict, non-JSON values by str()
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def describe_error(err):
+    # message stored for a sweep point that raised
+    return f"{type(err).__name__}: {err}"
+
+
+def _key_id(key):
+    # keys round-trip through JSON, so compare them in their JSON form
+    return json.dumps(key, default=float)
+
+
+class SweepStore:
+    # one {"config": <hash>, "key": <sweep point>, "payload": <result>} per line
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def records(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn last line from a crash mid-write
+                    continue
+
+    def completed(self, config):
+        """{key: payload} of the successful points stored for a config hash."""
+        # "error" payloads are left out so they are retried; later records win
+        done = {}
+        for record in self.records():
+            if record.get("config") != config:
+                continue
+            payload = record.get("payload")
+            if isinstance(payload, dict) and "error" in payload:
+                continue
+            done[_key_id(record["key"])] = (record["key"], payload)
+        return dict(done.values())
+
+    def append(self, config, key, payload, encoder=None):
+        line = json.dumps(
+            {"config": config, "key": key, "payload": payload}, cls=encoder
+        )
+        with open(self.filename, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_ROOT)
+from nf_analytic import load_solute_parameters, nanofiltration_analytic
+
+SOLUTE_PARAMETERS = os.path.join(REPO_ROOT, "solute_parameters.json")
+
+
+def _default_feed():
+    parameters = load_solute_parameters(SOLUTE_PARAMETERS)
+    flows = [parameters[j]["mass_flow"] for j in parameters]
+    return parameters, flows
+
+
+@pytest.mark.parametrize("free_ion", ["Cl", "Na"])
+def test_retentate_is_electroneutral(free_ion):
+    parameters, flows = _default_feed()
+    result = nanofiltration_analytic(100, flows, parameters, free_ion=free_ion)
+    charge = np.array([parameters[j]["charge"] for j in parameters])
+    mw = np.array([parameters[j]["mw"] for j in parameters])
+    net = (result["Retentate Solute Flow"][0] * charge / mw).sum()
+    scale = (np.array(flows) * np.abs(charge) / mw).sum()
+    assert abs(net) < 1e-12 * scale
+
+
+def test_zero_free_ion_flow_is_rejected():
+    parameters, flows = _default_feed()
+    flows[list(parameters).index("Cl")] = 0.0
+    with pytest.raises(ValueError):
+        nanofiltration_analytic(100, flows, parameters, free_ion="Cl")
+
+
+@pytest.mark.parametrize("free_ion", ["Cl", "Na"])
+def test_matches_nanofiltration_model(free_ion, monkeypatch):
+    pytest.importorskip("watertap")
+    train0 = os.path.join(REPO_ROOT, "Train0")
+    monkeypatch.chdir(train0)
+    monkeypatch.syspath_prepend(train0)
+    from NF_ZO import solve_nanofiltration
+
+    solve_nanofiltration(free_ion=free_ion, validate=True)
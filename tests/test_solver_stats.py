@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from solver_stats import parse_ipopt_log
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def _read(name):
+    with open(os.path.join(DATA, name)) as f:
+        return f.read()
+
+
+def test_parse_ipopt_3_13_log():
+    stats = parse_ipopt_log(_read("ipopt_3_13.log"))
+    assert stats["iterations"] == 2
+    assert stats["ipopt_time"] == pytest.approx(0.015)
+    assert stats["constraint_violation"] == pytest.approx(7.89e-9)
+    assert stats["exit_status"] == "Optimal Solution Found."
+
+
+def test_parse_ipopt_3_14_log():
+    stats = parse_ipopt_log(_read("ipopt_3_14.log"))
+    assert stats["iterations"] == 3
+    assert stats["ipopt_time"] == pytest.approx(0.021)
+    assert stats["constraint_violation"] == pytest.approx(1.23e-10)
+    assert stats["exit_status"] == "Optimal Solution Found."
+
+
+def test_parse_empty_log():
+    stats = parse_ipopt_log("")
+    assert all(value is None for value in stats.values())